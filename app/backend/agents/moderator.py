@@ -1,9 +1,39 @@
+import logging
 import re
-from config import client, model, MAX_SPEAK_COUNT
+from utils.llm import invoke_llm, invoke_structured, usage_tokens
+from agents.turn_plan import plan_from_config
+from utils.prompt_registry import get_prompt
+from langchain_core.runnables import RunnableConfig
 from state_types import AppState
+from utils.transcript import format_line
 
+# LLMのコメントが使えない場合の、司会から次の話者への一言
+HANDOFF_COMMENT = "では{name}さん、お願いします！"
 
-def moderator(state: AppState):
+
+def next_speaker_schema(candidate_names: list[str]) -> dict:
+    return {
+        "title": "next_speaker",
+        "description": "次の話者と、その話者に話を振る司会のコメント",
+        "type": "object",
+        "properties": {
+            "next_speaker": {"type": "string", "enum": candidate_names},
+            "comment": {"type": "string"},
+        },
+        "required": ["next_speaker", "comment"],
+        "additionalProperties": False,
+    }
+
+
+def round_robin(candidate_names: list[str], last_speaker: str) -> str:
+    """直前の話者の次の候補（直前が司会なら最初の候補）。"""
+    if last_speaker in candidate_names:
+        index = candidate_names.index(last_speaker) + 1
+        return candidate_names[index % len(candidate_names)]
+    return candidate_names[0]
+
+
+async def moderator(state: AppState, config: RunnableConfig):
     thema = state["thema"]
     user_message = state.get("user_message", "")
     genres_list = state.get("genres", [])
@@ -11,32 +41,35 @@ def moderator(state: AppState):
     seen_movies = state.get("seen_movies", "")
     speak_count = state["speak_count"]
     character_names = state["character_names"]
-    character_profiles = state["character_profiles"]
+
+    plan = plan_from_config(config)
 
     # 司会に憑依させるキャラクター（最初に選ばれたキャラ）
     last_speaker = character_names[0]
+    # 司会の人物設定（name/gender/age/job/hobby/personality）は chat_stream で組み立て済み
+    persona = state["character_profiles"][last_speaker]
 
     # 誰も話してないならfirst-templateを実行
     if speak_count == 0:
-        profile = character_profiles.get(last_speaker, {})
         # ChatPromptTemplateに食わせる辞書型のInput
         inputs = {
-            "name": last_speaker,
-            "gender": profile["性別"],
-            "age": profile["年齢"],
-            "job": profile["職業"],
-            "hobby": profile["趣味"],
-            "personality": profile["性格"],
+            **persona,
             "thema": thema,
             "genres": genres_text,
             "seen_movies": seen_movies if seen_movies else "（特になし）",
             "user_message": user_message if user_message else "特になし",
         }
         # LangSmith Prompt呼び出し
-        prompt = client.pull_prompt("maplejava/moderator-first-template")
+        prompt = await get_prompt("maplejava/moderator-first-template")
         prompt_value = prompt.invoke(inputs)
 
-        response = model.invoke(prompt_value)
+        response = await invoke_llm(
+            "moderator-first",
+            "maplejava/moderator-first-template",
+            prompt_value,
+            config,
+            plan.model,
+        )
 
         return {
             "last_speaker": last_speaker,
@@ -44,72 +77,100 @@ def moderator(state: AppState):
             "speak_count": speak_count + 1,
             "summary_done": False,
             "is_summary": False,
+            # speaker のターンが無いプラン（MAX_SPEAK_COUNT<=1 など）は、冒頭の次に締める
+            "wrap_up": not plan.turns,
+            "spent_tokens": usage_tokens(prompt_value, response),
         }
 
-    # 会話の上限数に達したならsummary-templateを実行
-    if speak_count >= MAX_SPEAK_COUNT:
-        summary_items = state.get("summary", [])
-        profile = character_profiles.get(last_speaker, {})
+    # ターンプランを使い切った（または予算切れ）ならsummary-templateを実行
+    if state["wrap_up"]:
+        transcript = state["transcript"]
         inputs = {
-            "name": last_speaker,
-            "gender": profile["性別"],
-            "age": profile["年齢"],
-            "job": profile["職業"],
-            "hobby": profile["趣味"],
-            "personality": profile["性格"],
+            **persona,
             "thema": thema,
-            "summary_text": "\n".join(
-                [f"{item['speaker']}：{item['text']}" for item in summary_items]
-            ),
+            "summary_text": transcript.text,
         }
 
-        prompt = client.pull_prompt("maplejava/moderator-summary-template")
+        prompt = await get_prompt("maplejava/moderator-summary-template")
         prompt_value = prompt.invoke(inputs)
-        response = model.invoke(prompt_value)
+        response = await invoke_llm(
+            "moderator-summary",
+            "maplejava/moderator-summary-template",
+            prompt_value,
+            config,
+            plan.model,
+        )
 
         return {
             "last_speaker": last_speaker,
             "last_comment": response.content,
             "next_speaker": "no_one",
             "is_summary": False,
+            "spent_tokens": usage_tokens(prompt_value, response),
         }
 
     # 上記いずれでもないならnext-speaker-templateを実行
-    summary_items = state.get("summary", [])
+    transcript = state["transcript"]
+    if not state["summary_done"]:
+        # 要約と並列に動いている場合、直前の発言はまだ要約に入っていないので原文で補う
+        transcript = transcript.append(
+            format_line(state["last_speaker"], state["last_comment"])
+        )
     # 司会キャラ（最初のキャラ）は除く
     candidate_names = [name for name in character_names if name != last_speaker]
 
-    profile = character_profiles.get(last_speaker, {})
+    if plan.speaker_selection == "round_robin":
+        # 話者は順番に指名し、LLMにはその話者に話を振るコメントだけを書かせる
+        candidates = [round_robin(candidate_names, state["last_speaker"])]
+    else:
+        candidates = candidate_names
+
     inputs = {
-        "name": last_speaker,
-        "gender": profile["性別"],
-        "age": profile["年齢"],
-        "job": profile["職業"],
-        "hobby": profile["趣味"],
-        "personality": profile["性格"],
+        **persona,
         "thema": thema,
-        "character_names": ", ".join(candidate_names),
-        "summary_text": "\n".join(
-            [f"{item['speaker']}：{item['text']}" for item in summary_items]
-        ),
+        "character_names": ", ".join(candidates),
+        "summary_text": transcript.text,
     }
-    prompt = client.pull_prompt("maplejava/moderator-next-speaker-template")
+    prompt = await get_prompt("maplejava/moderator-next-speaker-template")
     prompt_value = prompt.invoke(inputs)
 
-    response = model.invoke(prompt_value)
-
-    response_text = response.content
-
-    # LLMの回答から必要な情報を抽出
-    match_speaker = re.search(r"次の話者：(.+)", response_text)
-    match_comment = re.search(r"コメント：(.+)", response_text)
-
-    next_speaker = match_speaker.group(1).strip() if match_speaker else "未定"
-    last_comment = match_comment.group(1).strip() if match_comment else response_text
+    # 次の話者は候補の中からしか選べないよう、JSON Schemaで出力を制約する
+    parsed, response, structured = await invoke_structured(
+        "moderator-next",
+        prompt_value,
+        config,
+        next_speaker_schema(candidates),
+        plan.model,
+    )
+    if parsed is not None:
+        next_speaker = parsed["next_speaker"]
+        last_comment = parsed["comment"]
+    elif structured:
+        # 構造化出力を解析できなかった（途中で切れたJSONなど）。応答の文面はJSONなので見せず、
+        # 順番に指名して決まった一言で振る（コメントと実際の話者が食い違わないように）
+        next_speaker = round_robin(candidate_names, state["last_speaker"])
+        last_comment = HANDOFF_COMMENT.format(name=next_speaker)
+    else:
+        # 構造化出力が使えないモデルの場合は、従来の形式の回答から抽出する
+        response_text = response.content
+        match_speaker = re.search(r"次の話者：(.+)", response_text)
+        match_comment = re.search(r"コメント：(.+)", response_text)
+        next_speaker = match_speaker.group(1).strip() if match_speaker else ""
+        last_comment = (
+            match_comment.group(1).strip() if match_comment else response_text
+        )
+
+    if next_speaker not in candidates:
+        # 候補にない名前を返した場合は順番に指名する（存在しないキャラで落ちないように）
+        logging.warning(f"[moderator] 候補にない次の話者: {next_speaker!r}")
+        next_speaker = round_robin(candidate_names, state["last_speaker"])
+        # 抽出したコメントは別の話者宛てかもしれないので、指名した話者への一言にする
+        last_comment = HANDOFF_COMMENT.format(name=next_speaker)
 
     return {
         "last_speaker": last_speaker,
         "last_comment": last_comment,
         "next_speaker": next_speaker,
         "is_summary": False,
+        "spent_tokens": usage_tokens(prompt_value, response),
     }
@@ -1,82 +1,57 @@
-from config import client, model
-from utils.tavily import search_tavily
+from config import TOOL_RESULTS_TOKEN_BUDGET
+from utils.llm import invoke_llm, usage_tokens
+from utils.prompt_registry import get_prompt
+from langchain_core.runnables import RunnableConfig
 from state_types import AppState
-from utils.filmarks import fetch_filmarks_movies, fetch_filmarks_movies_by_genres
-from utils.tmdb_recommender import get_recommendations_from_seen_movies
+from utils.movie_record import render_tool_results
+from agents.tools import get_tool_results
+from agents.turn_plan import active_seconds, plan_from_config
 
 
-def speaker_agent(state: AppState):
+async def speaker_agent(state: AppState, config: RunnableConfig):
     speaker = state.get("next_speaker")
-    summary_items = state.get("summary", [])
-    character_profiles = state["character_profiles"]
-    profile = character_profiles.get(speaker, {})
+    transcript = state["transcript"]
+    # 人物設定（name/gender/age/job/hobby/personality）は chat_stream で組み立て済み
+    persona = state["character_profiles"][speaker]
     speak_count = state["speak_count"]
     thema = state.get("thema", "")
     last_comment = state.get("last_comment", "")
     genres = state.get("genres", [])
-    tool_results = []
     seen_movies = state.get("seen_movies", "")
 
-    # Web検索エージェント tavilyの使用
-    if speak_count == 1:
-        # 最初のジャンルのみを入力情報とする
-        first_genre = genres[0] if genres else "映画"
-        user_query = f"{first_genre} 映画 オススメ"
+    session_id = config.get("configurable", {}).get("thread_id")
 
-        try:
-            tool_results = search_tavily(user_query)
-        except Exception as e:
-            tool_results = ["検索に失敗しました：" + str(e)]
-
-        prompt = client.pull_prompt("maplejava/speaker-template")
-
-    # trend分析エージェント filmarksのスクレイピング　上映中の映画のレコメンド
-    elif speak_count == 2:
-        tool_results = fetch_filmarks_movies(10, True)
-        prompt = client.pull_prompt("maplejava/speaker-trend")
-
-    # trend分析エージェント filmarksのスクレイピング　公開予定の映画のレコメンド
-    elif speak_count == 3:
-        tool_results = fetch_filmarks_movies(10, False)
-        prompt = client.pull_prompt("maplejava/speaker-trend-coming")
-
-    # 過去作レコメンドエージェント filmarksのスクレイピング　過去作の映画のレコメンド
-    elif speak_count == 4:
-        # 複数ジャンルを一括で渡して取得
-        tool_results = fetch_filmarks_movies_by_genres(genres, 5)
-        prompt = client.pull_prompt("maplejava/speaker-trend-genres")
-
-    # 傾向分析エージェント TMDbの利用
-    elif speak_count == 5:
-        tool_results = get_recommendations_from_seen_movies(seen_movies)
-        prompt = client.pull_prompt("maplejava/speaker-user-history")
-
-    else:
-        prompt = client.pull_prompt("maplejava/speaker-template")
+    # ターン毎のツール結果は chat_streamで開始した先読みの完了を待つだけ。
+    # ターン毎のプロンプト・ツール・モデルはターンプランで決まる
+    plan = plan_from_config(config)
+    turn = plan.turn(speak_count)
+    tool_results = await get_tool_results(
+        session_id, speak_count, turn, genres, seen_movies
+    )
+    prompt = await get_prompt(turn.template)
 
     # ▼ prompt用のinputsを作成
     inputs = {
-        "name": speaker,
-        "gender": profile["性別"],
-        "age": profile["年齢"],
-        "job": profile["職業"],
-        "hobby": profile["趣味"],
-        "personality": profile["性格"],
+        **persona,
         "thema": thema,
         "last_comment": last_comment,
         "seen_movies": seen_movies,
-        "summary_text": "\n".join(
-            [f"{item['speaker']}：{item['text']}" for item in summary_items]
+        "summary_text": transcript.text,
+        # 映画レコードはここで1度だけテキスト化し、トークン数の上限で打ち切る
+        "tool_results": (
+            render_tool_results(tool_results, TOOL_RESULTS_TOKEN_BUDGET)
+            if tool_results
+            else "特に検索は行っていません。"
         ),
-        "tool_results": "\n".join(tool_results)
-        if tool_results
-        else "特に検索は行っていません。",
         "genres": ", ".join(genres) if genres else "ジャンル指定なし",
     }
 
     prompt_value = prompt.invoke(inputs)
 
-    response = model.invoke(prompt_value)
+    response = await invoke_llm(
+        "speaker", turn.template, prompt_value, config, plan.model_for(speak_count)
+    )
+    spent_tokens = usage_tokens(prompt_value, response)
 
     return {
         "last_speaker": speaker,
@@ -84,4 +59,11 @@ def speaker_agent(state: AppState):
         "speak_count": speak_count + 1,
         "summary_done": False,
         "is_summary": False,
+        "spent_tokens": spent_tokens,
+        # プランのターンを使い切った、または予算を超えそうなら、この発言で締めに入る
+        "wrap_up": plan.should_wrap_up(
+            speak_count + 1,
+            active_seconds(state, config),
+            state["spent_tokens"] + spent_tokens,
+        ),
     }
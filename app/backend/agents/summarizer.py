@@ -1,8 +1,16 @@
-from config import client, model
+from utils.llm import invoke_llm, usage_tokens
+from agents.turn_plan import plan_from_config
+from utils.prompt_registry import get_prompt
+from langchain_core.runnables import RunnableConfig
 from state_types import AppState
 
 
-def summarizer_agent(state: AppState):
+# 要約を司会の次のステップと並列に実行するモードか（run configで指定）
+def overlap_summary_enabled(config: RunnableConfig) -> bool:
+    return bool(config.get("configurable", {}).get("overlap_summary", False))
+
+
+async def summarizer_agent(state: AppState, config: RunnableConfig):
     last_speaker = state.get("last_speaker")
     last_comment = state.get("last_comment")
     thema = state.get("thema")
@@ -12,14 +20,26 @@ def summarizer_agent(state: AppState):
         "last_comment": last_comment,
         "last_speaker": last_speaker,
     }
-    prompt = client.pull_prompt("maplejava/summarizer-template")
+    prompt = await get_prompt("maplejava/summarizer-template")
     prompt_value = prompt.invoke(inputs)
 
-    response = model.invoke(prompt_value)
+    response = await invoke_llm(
+        "summarizer",
+        "maplejava/summarizer-template",
+        prompt_value,
+        config,
+        plan_from_config(config).model,
+    )
 
-    return {
-        "last_speaker": last_speaker,
-        "summary": [{"speaker": last_speaker, "text": response.content}],
+    item = {"speaker": last_speaker, "text": response.content}
+    update = {
+        "summary": [item],
+        "transcript": [item],
         "summary_done": True,
-        "is_summary": True,
+        "spent_tokens": usage_tokens(prompt_value, response),
     }
+    # 並列モードでは司会と同じステップで動くため、司会が書くキーは返さない
+    if not overlap_summary_enabled(config):
+        update["last_speaker"] = last_speaker
+        update["is_summary"] = True
+    return update
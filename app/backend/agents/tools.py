@@ -0,0 +1,115 @@
+# --- agents/tools.py ---
+# speaker_agent がターン毎に使うツールと、その結果の先読み（speculative prefetch）。
+# どのターンでどのツールを使うかはターンプラン（agents/turn_plan.py）で決まるため、
+# chat_stream でStateを初期化した時点で全ターン分の取得を並列に開始しておき、
+# speaker_agent は出来上がった結果を受け取るだけにする。
+# ツールのモジュール（スクレイパ・HTTPクライアントなど）は使う時になってからimportする。
+import asyncio
+import logging
+from agents.turn_plan import Turn, TurnPlan
+from utils.llm import CANCELLED_CALLS
+from utils.tracing import span
+
+
+# Web検索エージェント tavilyの使用
+async def search_web(genres: list[str], seen_movies: str) -> list:
+    # 最初のジャンルのみを入力情報とする
+    first_genre = genres[0] if genres else "映画"
+    user_query = f"{first_genre} 映画 オススメ"
+    try:
+        from utils.tavily import search_tavily
+
+        return await search_tavily(user_query)
+    except Exception as e:
+        return ["検索に失敗しました：" + str(e)]
+
+
+# trend分析エージェント filmarksのスクレイピング　上映中の映画のレコメンド
+async def filmarks_now(genres: list[str], seen_movies: str) -> list:
+    from utils.filmarks_prefetch import get_filmarks_movies
+
+    return await get_filmarks_movies(True)
+
+
+# trend分析エージェント filmarksのスクレイピング　公開予定の映画のレコメンド
+async def filmarks_coming(genres: list[str], seen_movies: str) -> list:
+    from utils.filmarks_prefetch import get_filmarks_movies
+
+    return await get_filmarks_movies(False)
+
+
+# 過去作レコメンドエージェント filmarksのスクレイピング　過去作の映画のレコメンド
+async def filmarks_genres(genres: list[str], seen_movies: str) -> list:
+    from utils.filmarks_prefetch import get_filmarks_movies_by_genres
+
+    # 複数ジャンルを一括で渡して取得
+    return await get_filmarks_movies_by_genres(genres)
+
+
+# 傾向分析エージェント TMDbの利用
+async def tmdb_history(genres: list[str], seen_movies: str) -> list:
+    from utils.tmdb_recommender import get_recommendations_from_seen_movies
+
+    try:
+        return await get_recommendations_from_seen_movies(seen_movies)
+    except Exception as e:
+        # TMDbが使えなくても会話は続ける（このターンはツール結果なしで話す）
+        logging.warning(f"[tool] tmdb_history の取得に失敗: {e!r}")
+        return []
+
+
+# ターンプランで指定するツール名 → ツール
+TOOLS = {
+    "search_web": search_web,
+    "filmarks_now": filmarks_now,
+    "filmarks_coming": filmarks_coming,
+    "filmarks_genres": filmarks_genres,
+    "tmdb_history": tmdb_history,
+}
+
+_prefetched = {}  # {セッションID: {speak_count: ツール結果のTask}}
+
+
+def start_tool_prefetch(
+    session_id: str,
+    plan: TurnPlan,
+    genres: list[str],
+    seen_movies: str,
+    from_turn: int = 1,
+) -> None:
+    # 再接続で途中から再開する場合は、まだ済んでいないターン（from_turn 以降）だけ取得する
+    _prefetched[session_id] = {
+        speak_count: asyncio.create_task(
+            TOOLS[turn.tool](genres, seen_movies), name=turn.tool
+        )
+        for speak_count, turn in enumerate(plan.turns, start=1)
+        if turn.tool and speak_count >= from_turn
+    }
+
+
+async def get_tool_results(
+    session_id: str, speak_count: int, turn: Turn, genres: list[str], seen_movies: str
+) -> list:
+    task = _prefetched.get(session_id, {}).pop(speak_count, None)
+    if task is not None:
+        try:
+            # speaker_agent が先読みの完了を待たされた時間
+            async with span("tool_prefetch", name=turn.tool):
+                return await task
+        except asyncio.CancelledError:
+            CANCELLED_CALLS.inc(kind="tool", name=turn.tool)
+            raise
+    # 先読みしていない場合（セッションIDなし等）はその場で取得する
+    return await TOOLS[turn.tool](genres, seen_movies) if turn.tool else []
+
+
+# セッション終了時に、使われなかった先読みを止める
+def cancel_tool_prefetch(session_id: str) -> None:
+    for speak_count, task in _prefetched.pop(session_id, {}).items():
+        if not task.done():
+            task.cancel()
+            CANCELLED_CALLS.inc(kind="tool", name=task.get_name())
+        elif not task.cancelled() and task.exception() is not None:
+            logging.warning(
+                f"[prefetch] turn={speak_count} のツール取得に失敗: {task.exception()}"
+            )
@@ -0,0 +1,118 @@
+# --- agents/turn_plan.py ---
+# 会話の進め方（ターンプラン）。speaker のターン毎に使うプロンプト・ツール・モデルと、
+# セッション全体の時間・トークンの予算をまとめて持つ。
+# /chat/stream の plan クエリパラメータ（fast | standard | deep）で選ぶ。
+from dataclasses import dataclass, replace
+
+import time
+
+from config import DEEP_MODEL, MAX_SPEAK_COUNT, NEXT_SPEAKER_SELECTION, TURN_PLAN
+
+
+@dataclass(frozen=True, slots=True)
+class Turn:
+    template: str  # speaker のプロンプト（LangSmith上の名前）
+    tool: str | None = None  # agents/tools.py の TOOLS のキー。None ならツールなし
+    model: str | None = None  # None なら TurnPlan.model
+
+
+@dataclass(frozen=True, slots=True)
+class TurnPlan:
+    name: str
+    turns: tuple[Turn, ...]  # speak_count=1 から順に speaker のターン
+    max_seconds: float  # セッション全体の時間の予算（秒）
+    max_tokens: int  # セッション全体のトークン数の予算
+    model: str | None = None  # 司会・要約などのモデル。None なら既定のモデル
+    # 次の話者の選び方: "llm"（司会がLLMで選ぶ） | "round_robin"（順番に指名し、LLMはコメントだけ書く）
+    speaker_selection: str = NEXT_SPEAKER_SELECTION
+
+    @property
+    def recursion_limit(self) -> int:
+        # LangGraphのステップ数の上限（1ターン = 司会・発言・要約の3ステップ + 冒頭と締め）
+        return 3 * len(self.turns) + 10
+
+    def turn(self, speak_count: int) -> Turn:
+        return self.turns[speak_count - 1]
+
+    def model_for(self, speak_count: int) -> str | None:
+        return self.turn(speak_count).model or self.model
+
+    def should_wrap_up(
+        self, speak_count: int, elapsed: float, spent_tokens: int
+    ) -> bool:
+        """speak_count 回目の発言の後、次のターンに進まずに締めに入るかどうか。"""
+        if speak_count > len(self.turns):
+            return True
+        # これまでの1発言あたりの平均から、次のターンと締めの分を見積もって予算を超えるなら終える
+        per_turn_seconds = elapsed / speak_count
+        per_turn_tokens = spent_tokens / speak_count
+        return (
+            elapsed + 2 * per_turn_seconds > self.max_seconds
+            or spent_tokens + 2 * per_turn_tokens > self.max_tokens
+        )
+
+
+_STANDARD_TURNS = (
+    Turn("maplejava/speaker-template", "search_web"),
+    Turn("maplejava/speaker-trend", "filmarks_now"),
+    Turn("maplejava/speaker-trend-coming", "filmarks_coming"),
+    Turn("maplejava/speaker-trend-genres", "filmarks_genres"),
+    Turn("maplejava/speaker-user-history", "tmdb_history"),
+)
+
+PLANS = {
+    # モバイル向け: 発言は3回、ツールは先読み済みのFilmarksのみ、話者は順番に指名する
+    "fast": TurnPlan(
+        name="fast",
+        turns=(
+            Turn("maplejava/speaker-trend", "filmarks_now"),
+            Turn("maplejava/speaker-trend-genres", "filmarks_genres"),
+            Turn("maplejava/speaker-template"),
+        ),
+        max_seconds=30,
+        max_tokens=15000,
+        speaker_selection="round_robin",
+    ),
+    # 従来どおりの5ターン（MAX_SPEAK_COUNT に合わせて削る・ツールなしの発言を足す）
+    "standard": TurnPlan(
+        name="standard",
+        turns=(
+            _STANDARD_TURNS
+            + (Turn("maplejava/speaker-template"),)
+            * max(0, MAX_SPEAK_COUNT - 1 - len(_STANDARD_TURNS))
+        )[: MAX_SPEAK_COUNT - 1],
+        max_seconds=120,
+        max_tokens=60000,
+    ),
+    # デスクトップ向け: 全ツールを使い、最後にツールなしでこれまでの話を踏まえた発言を1回。
+    # （1ターン目と同じWeb検索を繰り返しても同じ結果しか得られないため）
+    # speaker は上位モデル（DEEP_MODEL）で話す
+    "deep": TurnPlan(
+        name="deep",
+        turns=tuple(
+            replace(turn, model=DEEP_MODEL)
+            for turn in _STANDARD_TURNS
+            + (Turn("maplejava/speaker-template"),)
+        ),
+        max_seconds=240,
+        max_tokens=150000,
+    ),
+}
+
+
+def get_plan(name: str | None) -> TurnPlan:
+    # 不明な名前は既定のプランにする
+    return PLANS.get(name) or PLANS.get(TURN_PLAN) or PLANS["standard"]
+
+
+def plan_from_config(config) -> TurnPlan:
+    return get_plan(config.get("configurable", {}).get("turn_plan"))
+
+
+def active_seconds(state, config) -> float:
+    """セッション開始からの経過時間のうち、クライアントが切断していた時間を除いたもの。
+
+    切断中の時間は再接続時に chat_stream が configurable の paused_seconds に足しておく。
+    """
+    paused = config.get("configurable", {}).get("paused_seconds", 0.0)
+    return time.time() - state["started_at"] - paused
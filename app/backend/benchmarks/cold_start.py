@@ -0,0 +1,96 @@
+# --- benchmarks/cold_start.py ---
+# バックエンドのコールドスタートを計測し、予算を超えたら終了コード1で終わる。
+#   1. python -X importtime -c "import main" の合計import時間と、時間のかかった上位モジュール
+#   2. uvicorn を起動してから /health が最初に200を返すまでの時間（time-to-first-request）
+#
+# 使い方（app/backend で実行）:
+#   python -m benchmarks.cold_start --import-budget-ms 1000 --ttfr-budget-ms 3000
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+def measure_import(top: int) -> float:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        capture_output=True,
+        text=True,
+        env=os.environ.copy(),
+        check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            rows.append((int(cumulative), name.rstrip()))
+
+    total_us = next(us for us, name in rows if name.strip() == "main")
+    # インデントが浅い（main直下の）モジュールを時間順に表示する
+    direct = [
+        (us, name.strip())
+        for us, name in rows
+        if name.startswith("   ") and not name.startswith("     ")
+    ]
+    for us, name in sorted(direct, reverse=True)[:top]:
+        print(f"  {us / 1000:8.1f}ms  {name}")
+    return total_us / 1000
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_first_request(timeout: float) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                response = httpx.get(f"http://127.0.0.1:{port}/health", timeout=0.5)
+                if response.status_code == 200:
+                    return (time.perf_counter() - started) * 1000
+            except httpx.TransportError:
+                pass
+            time.sleep(0.02)
+        raise SystemExit(f"{timeout}秒以内に /health が応答しませんでした")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--import-budget-ms", type=float, default=1000.0)
+    parser.add_argument("--ttfr-budget-ms", type=float, default=3000.0)
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    print("import main（上位モジュール）:")
+    import_ms = measure_import(args.top)
+    ttfr_ms = measure_first_request(args.timeout)
+
+    print(
+        f"import main:            {import_ms:8.1f}ms (予算 {args.import_budget_ms}ms)"
+    )
+    print(f"time-to-first-request:  {ttfr_ms:8.1f}ms (予算 {args.ttfr_budget_ms}ms)")
+    if import_ms > args.import_budget_ms or ttfr_ms > args.ttfr_budget_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+# --- benchmarks/conversation.py ---
+# ネットワークなしで会話グラフ全体を動かすエンドツーエンドのベンチマーク。
+# 外部サービスは記録済みの応答（benchmarks/fixtures）に遅延を付けて再生する。
+#   - LangSmith : fixtures/prompts（プロンプトのスナップショットと同じ形式）
+#   - OpenAI    : utils/local_model.py のローカルモデルが fixtures/llm/replies.json を返す
+#   - Filmarks  : fixtures/filmarks のHTML
+#   - TMDb/Tavily: fixtures/tmdb・fixtures/tavily のJSON（httpx.MockTransport で返す）
+# uvicornを同じプロセスで起動し、/chat/stream を指定の同時接続数で叩いて、
+# ターン毎・会話全体のレイテンシのパーセンタイル、スループット、ピークRSS、
+# 役割毎の入力トークンのうちプロンプトキャッシュから読まれた割合を表示する。
+#
+# 使い方（app/backend で実行）:
+#   python -m benchmarks.conversation --levels 1,5,10 --sessions 20
+#   python -m benchmarks.conversation --plan fast --stream-tokens --llm-latency 0.8
+#
+# プロンプトのフィクスチャを本番の内容に揃えるときは、
+#   python -m utils.prompt_registry --pin
+# で保存したスナップショットを fixtures/prompts にコピーする。
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures"
+
+PARAMS = {
+    "user_message": "最近おすすめの映画を教えて",
+    "genres": "SF,ホラー",
+    "seen_movies": "名探偵コナン",
+    "characters": "ルフィ,ナルト,ケロロ軍曹",
+}
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Latency:
+    """平均 mean 秒・ばらつき ±jitter の割合で遅延を作る（シード固定で再現できる）。"""
+
+    def __init__(self, mean: float, jitter: float, seed: int):
+        self.mean = mean
+        self.jitter = jitter
+        self.random = random.Random(seed)
+
+    def sample(self) -> float:
+        return max(0.0, self.mean * (1 + self.random.uniform(-1, 1) * self.jitter))
+
+
+def _read(path: str) -> str:
+    return (FIXTURE_DIR / path).read_text(encoding="utf-8")
+
+
+def fixture_transport(latency: Latency) -> httpx.MockTransport:
+    """Filmarks・TMDb・Tavily へのリクエストに記録済みの応答を返す。"""
+    pages = {
+        "/list/now": _read("filmarks/list_now.html"),
+        "/list/coming": _read("filmarks/list_coming.html"),
+    }
+    genre_page = _read("filmarks/list_genre.html")
+    detail_page = _read("filmarks/detail.html")
+    tmdb = {
+        name: json.loads(_read(f"tmdb/{name}.json"))
+        for name in ("search_movie", "recommendations", "genre_list")
+    }
+    tavily = json.loads(_read("tavily/search.json"))
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency.sample())
+        host, path = request.url.host, request.url.path
+        if host == "filmarks.com":
+            if path.startswith("/list/genre/"):
+                return httpx.Response(200, text=genre_page)
+            return httpx.Response(200, text=pages.get(path, detail_page))
+        if host == "api.themoviedb.org":
+            if path.startswith("/3/search/"):
+                return httpx.Response(200, json=tmdb["search_movie"])
+            if path.endswith("/recommendations"):
+                return httpx.Response(200, json=tmdb["recommendations"])
+            if path.startswith("/3/genre/"):
+                return httpx.Response(200, json=tmdb["genre_list"])
+        if host == "api.tavily.com":
+            return httpx.Response(200, json=tavily)
+        return httpx.Response(404)
+
+    return httpx.MockTransport(handle)
+
+
+class FixturePromptClient:
+    """LangSmithの pull_prompt の代わりに fixtures/prompts を返す。"""
+
+    def __init__(self, latency: Latency):
+        self.latency = latency
+
+    def pull_prompt(self, name: str):
+        from langchain_core.load import load
+
+        time.sleep(self.latency.sample())
+        path = FIXTURE_DIR / "prompts" / (name.replace("/", "__") + ".json")
+        with open(path, "r", encoding="utf-8") as f:
+            return load(json.load(f))
+
+
+def configure(args, workdir: str) -> None:
+    # config.py は import時に環境変数を読むので、アプリをimportする前に設定する
+    os.environ.update(
+        {
+            "LLM_BACKEND": "local",
+            "LOCAL_MODEL_LATENCY": str(args.llm_latency),
+            "LOCAL_MODEL_TOKENS_PER_SEC": str(args.llm_tokens_per_sec),
+            "LOCAL_MODEL_REPLIES": str(FIXTURE_DIR / "llm" / "replies.json"),
+            "TURN_PLAN": args.plan,
+            "OVERLAP_SUMMARY": "1" if args.overlap_summary else "0",
+            "CHECKPOINT_BACKEND": "memory",
+            # キャッシュ・スナップショットは毎回空の一時ディレクトリに作る（前回の結果を使わない）
+            "FILMARKS_CACHE_PATH": os.path.join(workdir, "filmarks_cache.sqlite3"),
+            "PROMPT_SNAPSHOT_DIR": os.path.join(workdir, "prompt_snapshots"),
+            "LANGSMITH_TRACING": "false",
+            "LANGCHAIN_TRACING_V2": "false",
+        }
+    )
+    os.environ.setdefault("TMDb_API_KEY", "benchmark")
+    os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+
+
+def install_fixtures(args) -> None:
+    from utils import http_client, prompt_registry
+
+    prompt_registry.get_client = lambda: FixturePromptClient(
+        Latency(args.prompt_latency, args.jitter, args.seed)
+    )
+    http_client._client = httpx.AsyncClient(
+        transport=fixture_transport(Latency(args.http_latency, args.jitter, args.seed))
+    )
+
+
+async def run_session(client: httpx.AsyncClient, url: str, params: dict) -> dict:
+    started = time.perf_counter()
+    result = {"ttfb": None, "total": None, "turns": {}, "ok": False, "error": None}
+    last_done = started
+    try:
+        async with client.stream(
+            "GET", f"{url}/chat/stream", params=params
+        ) as response:
+            if response.status_code != 200:
+                result["error"] = f"HTTP {response.status_code}"
+            event = "message"
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[7:]
+                    continue
+                if not line.startswith("data:"):
+                    if not line:
+                        event = "message"
+                    continue
+                now = time.perf_counter()
+                if result["ttfb"] is None and event in ("message", "token"):
+                    result["ttfb"] = now - started
+                if event == "end":
+                    result["ok"] = True
+                    break
+                if event == "busy":
+                    result["error"] = "busy"
+                    break
+                if event != "message":
+                    continue
+                payload = json.loads(line[5:])
+                # 確定した発言（要約以外）の間隔を、そのターンの所要時間とする
+                if "turn_id" in payload:
+                    result["turns"][payload["turn_id"]] = now - last_done
+                    last_done = now
+    except httpx.HTTPError as e:
+        result["error"] = type(e).__name__
+    result["total"] = time.perf_counter() - started
+    return result
+
+
+async def run_level(url: str, concurrency: int, sessions: int, args) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    params = {**PARAMS, "plan": args.plan}
+    if args.stream_tokens:
+        params["stream_tokens"] = "1"
+
+    async def limited(client):
+        async with semaphore:
+            return await run_session(client, url, params)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    timeout = httpx.Timeout(args.timeout)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        results = await asyncio.gather(*(limited(client) for _ in range(sessions)))
+    elapsed = time.perf_counter() - started
+
+    completed = [r for r in results if r["ok"]]
+    turns = {}
+    for r in completed:
+        for turn_id, seconds in r["turns"].items():
+            turns.setdefault(turn_id, []).append(seconds)
+    return {
+        "concurrency": concurrency,
+        "completed": len(completed),
+        "sessions": sessions,
+        "errors": sorted({r["error"] for r in results if r["error"]}),
+        "ttfb": [r["ttfb"] for r in completed if r["ttfb"] is not None],
+        "total": [r["total"] for r in completed],
+        "turns": dict(sorted(turns.items())),
+        "throughput": len(completed) / elapsed,
+        "turn_throughput": sum(len(r["turns"]) for r in completed) / elapsed,
+    }
+
+
+def report(stats: dict) -> None:
+    total, ttfb = stats["total"], stats["ttfb"]
+    print(
+        f"\n== concurrency={stats['concurrency']} "
+        f"completed={stats['completed']}/{stats['sessions']} "
+        f"throughput={stats['throughput']:.2f} sessions/s "
+        f"({stats['turn_throughput']:.2f} turns/s)"
+    )
+    if stats["errors"]:
+        print(f"errors: {', '.join(stats['errors'])}")
+    print(f"{'':<14}{'p50':>8}{'p95':>8}{'p99':>8}{'mean':>8}")
+    rows = [("ttfb", ttfb), ("end-to-end", total)] + [
+        # ターンIDは奇数が司会、偶数が話者（endpoints/chat_stream.py の turn_id_for）
+        (f"turn {turn_id} {'spk' if turn_id % 2 == 0 else 'mod'}", samples)
+        for turn_id, samples in stats["turns"].items()
+    ]
+    for label, samples in rows:
+        mean = statistics.mean(samples) if samples else float("nan")
+        print(
+            f"{label:<14}{percentile(samples, 50):>8.2f}{percentile(samples, 95):>8.2f}"
+            f"{percentile(samples, 99):>8.2f}{mean:>8.2f}"
+        )
+
+
+def report_cache() -> None:
+    # ローカルモデルが真似たプロンプトキャッシュ（utils/local_model.py）の読み取り量
+    from utils.llm import INPUT_TOKENS
+
+    tokens = {}  # {役割: {"true": キャッシュ分, "false": それ以外}}
+    for key, value in INPUT_TOKENS.values.items():
+        labels = dict(key)
+        tokens.setdefault(labels["role"], {}).setdefault(labels["cached"], 0.0)
+        tokens[labels["role"]][labels["cached"]] += value
+    print(f"\n{'input tokens':<20}{'total':>10}{'cached':>10}{'ratio':>8}")
+    for role, counts in sorted(tokens.items()):
+        total = counts.get("true", 0.0) + counts.get("false", 0.0)
+        cached = counts.get("true", 0.0)
+        print(
+            f"{role:<20}{total:>10.0f}{cached:>10.0f}"
+            f"{cached / total if total else 0.0:>8.1%}"
+        )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--levels", default="1,5,10")
+    parser.add_argument(
+        "--sessions", type=int, default=0, help="各同時接続数で実行する会話数"
+    )
+    parser.add_argument("--plan", default="standard")
+    parser.add_argument("--stream-tokens", action="store_true")
+    parser.add_argument("--overlap-summary", action="store_true")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=80.0)
+    parser.add_argument("--http-latency", type=float, default=0.15)
+    parser.add_argument("--prompt-latency", type=float, default=0.3)
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure(args, workdir)
+        install_fixtures(args)
+        import uvicorn
+
+        import main as app_main
+
+        port = free_port()
+        server = uvicorn.Server(
+            uvicorn.Config(app_main.app, port=port, log_level="warning")
+        )
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.05)
+        # 起動時のプロンプト取得が終わってから計測する
+        await app_main.app.state.warm_prompts
+
+        url = f"http://127.0.0.1:{port}"
+        try:
+            for level in [int(x) for x in args.levels.split(",")]:
+                report(await run_level(url, level, args.sessions or level, args))
+        finally:
+            server.should_exit = True
+            await serving
+
+    report_cache()
+    # ru_maxrss はLinuxではKiB（サーバとクライアントを合わせたプロセス全体）
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"\npeak RSS: {peak_rss / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,48 @@
+# --- benchmarks/graph_setup.py ---
+# /chat/stream のリクエスト毎のグラフ準備コストを比較するマイクロベンチマーク。
+#   before: リクエスト毎に build_graph() でStateGraphを構築・コンパイル
+#   after : 起動時にコンパイルした app.state.flow を参照するだけ
+#
+# 使い方（app/backend で実行）:
+#   python -m benchmarks.graph_setup --iterations 200
+import argparse
+import statistics
+import time
+
+from fastapi import FastAPI
+
+from graph.chat_graph import build_graph
+
+
+def measure(fn, iterations: int) -> list[float]:
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def report(label: str, samples: list[float]) -> None:
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(
+        f"{label:<28} mean={statistics.mean(samples):8.3f}ms "
+        f"p50={statistics.median(samples):8.3f}ms p95={p95:8.3f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    app = FastAPI()
+    app.state.flow = build_graph()
+
+    report("before: build_graph()", measure(build_graph, args.iterations))
+    report("after : app.state.flow", measure(lambda: app.state.flow, args.iterations))
+
+
+if __name__ == "__main__":
+    main()
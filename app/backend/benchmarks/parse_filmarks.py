@@ -0,0 +1,63 @@
+# --- benchmarks/parse_filmarks.py ---
+# 保存済みのFilmarks HTML（benchmarks/fixtures/filmarks）を使って、
+# BeautifulSoup(html.parser)版とlxml版のパース時間・ピークメモリを比較する。
+# 両者の出力が一致することも確認する。
+# ※ピークメモリはtracemallocで測るPython側の確保量。lxmlがC側で確保する木は含まない。
+#
+# 使い方（app/backend で実行）:
+#   python -m benchmarks.parse_filmarks --iterations 50
+import argparse
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+from utils import filmarks_parser
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures" / "filmarks"
+
+CASES = [
+    ("list_now.html", "list"),
+    ("list_coming.html", "list"),
+    ("list_genre.html", "list"),
+    ("detail.html", "detail"),
+    ("detail_minimal.html", "detail"),
+]
+
+
+def measure(fn, html: str, iterations: int) -> tuple[float, float]:
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn(html)
+        samples.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    fn(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(samples), peak / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    if filmarks_parser.lxml is None:
+        raise SystemExit("lxml がインストールされていません")
+
+    print(f"{'fixture':<22}{'parser':<8}{'p50(ms)':>10}{'peak(KiB)':>12}")
+    for filename, kind in CASES:
+        html = (FIXTURE_DIR / filename).read_text(encoding="utf-8")
+        soup_fn = getattr(filmarks_parser, f"parse_{kind}_soup")
+        lxml_fn = getattr(filmarks_parser, f"parse_{kind}_lxml")
+        assert soup_fn(html) == lxml_fn(html), f"{filename}: パース結果が一致しません"
+
+        for label, fn in (("soup", soup_fn), ("lxml", lxml_fn)):
+            median_ms, peak_kib = measure(fn, html, args.iterations)
+            print(f"{filename:<22}{label:<8}{median_ms:>10.2f}{peak_kib:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# --- benchmarks/sse_load.py ---
+# 1つのuvicornワーカーが同時に何本の /chat/stream セッションを捌けるかを測る負荷テスト。
+#
+# 使い方（app/backend で実行）:
+#   uvicorn main:app --port 5000 --workers 1
+#   python -m benchmarks.sse_load --url http://127.0.0.1:5000 --levels 1,5,10,20,50
+#
+# 各同時接続数で全セッションを一斉に開始し、最初のイベントまでの時間（TTFB）と
+# ENDイベントまでの時間を集計する。TTFBのp95が --ttfb-slo 秒以内に収まった
+# 最大の同時接続数を「1ワーカーで保持できるセッション数」として表示する。
+# 同期ノード版（変更前）と非同期ノード版（変更後）の両方に対して実行して比較する。
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+PARAMS = {
+    "user_message": "最近おすすめの映画を教えて",
+    "genres": "SF,ホラー",
+    "seen_movies": "名探偵コナン",
+    "characters": "ルフィ,ナルト,ケロロ軍曹",
+}
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def run_session(client: httpx.AsyncClient, url: str, timeout: float) -> dict:
+    started = time.perf_counter()
+    result = {"ttfb": None, "total": None, "ok": False, "error": None}
+    try:
+        async with client.stream(
+            "GET", f"{url}/chat/stream", params=PARAMS, timeout=timeout
+        ) as response:
+            # 400（知らないキャラクターなど）で全件失敗しているのに気付けるよう、理由を残す
+            if response.status_code != 200:
+                result["error"] = f"HTTP {response.status_code}"
+            async for line in response.aiter_lines():
+                if result["ttfb"] is None and line.startswith("data:"):
+                    result["ttfb"] = time.perf_counter() - started
+                if line.startswith("event: end"):
+                    result["ok"] = True
+                    break
+    except (httpx.HTTPError, asyncio.TimeoutError) as e:
+        result["error"] = type(e).__name__
+    result["total"] = time.perf_counter() - started
+    return result
+
+
+async def run_level(url: str, concurrency: int, timeout: float) -> dict:
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits) as client:
+        results = await asyncio.gather(
+            *(run_session(client, url, timeout) for _ in range(concurrency))
+        )
+    ttfbs = [r["ttfb"] for r in results if r["ttfb"] is not None]
+    totals = [r["total"] for r in results if r["ok"]]
+    return {
+        "concurrency": concurrency,
+        "completed": sum(r["ok"] for r in results),
+        "ttfb_p50": percentile(ttfbs, 50),
+        "ttfb_p95": percentile(ttfbs, 95),
+        "total_mean": statistics.mean(totals) if totals else float("nan"),
+        "errors": sorted({r["error"] for r in results if r["error"]}),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--levels", default="1,5,10,20,50")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--ttfb-slo", type=float, default=10.0)
+    args = parser.parse_args()
+
+    held = 0
+    print("concurrency completed ttfb_p50 ttfb_p95 total_mean")
+    for level in [int(x) for x in args.levels.split(",")]:
+        stats = await run_level(args.url, level, args.timeout)
+        print(
+            f"{stats['concurrency']:>11} {stats['completed']:>9} "
+            f"{stats['ttfb_p50']:>8.2f} {stats['ttfb_p95']:>8.2f} "
+            f"{stats['total_mean']:>10.2f}"
+        )
+        if stats["errors"]:
+            print(f"{'':>11} errors: {', '.join(stats['errors'])}")
+        if stats["completed"] == level and stats["ttfb_p95"] <= args.ttfb_slo:
+            held = level
+    print(f"1ワーカーで保持できた同時セッション数: {held}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
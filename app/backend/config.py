@@ -1,11 +1,138 @@
-from langchain_openai import ChatOpenAI
-from langsmith import Client
+from functools import lru_cache
+from pathlib import Path
 import logging
+import os
 
-model = ChatOpenAI(model="gpt-4o-mini")
-client = Client()
 
-MAX_SPEAK_COUNT = 6
+# LangSmithのクライアントは初回利用時に生成する（import時の副作用を無くし起動を速くする）
+@lru_cache(maxsize=None)
+def get_client():
+    from langsmith import Client
+
+    # LangSmithが遅い・落ちている場合に備えてタイムアウトを短めに設定（ミリ秒）
+    return Client(timeout_ms=int(os.environ.get("PROMPT_FETCH_TIMEOUT_MS", "5000")))
+
+
+# LLM（役割ごとの設定は utils/model_registry.py）
+# 既定のモデル（ターンプランでモデルの指定が無い場合に使う）
+DEFAULT_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+# 要約・話者選びなど短い定型の出力に使う小さいモデル
+SMALL_MODEL = os.environ.get("OPENAI_SMALL_MODEL", "gpt-4.1-nano")
+# deep プランの speaker に使う上位モデル
+DEEP_MODEL = os.environ.get("OPENAI_DEEP_MODEL", "gpt-4o")
+# "local" にすると全ての役割でローカルの代替モデルを使う（オフラインのベンチマーク用）
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "openai")
+# 役割ごとのモデルの上書き: MODEL_SUMMARIZER, MODEL_MODERATOR_NEXT など
+ROLE_MODEL_OVERRIDES = {
+    key[len("MODEL_") :].lower().replace("_", "-"): value
+    for key, value in os.environ.items()
+    if key.startswith("MODEL_")
+}
+# ローカルの代替モデルの最初のトークンまでの秒数と、1秒あたりの出力トークン数
+LOCAL_MODEL_LATENCY = float(os.environ.get("LOCAL_MODEL_LATENCY", "0.3"))
+LOCAL_MODEL_TOKENS_PER_SEC = float(os.environ.get("LOCAL_MODEL_TOKENS_PER_SEC", "80"))
+# ローカルモデルの応答を差し替えるJSON（{役割: [応答, ...]}）。ベンチマークで記録済みの応答を流す
+LOCAL_MODEL_REPLIES = os.environ.get("LOCAL_MODEL_REPLIES", "")
+# standard プランの発言数の上限（司会の最初の発言を含む）
+MAX_SPEAK_COUNT = int(os.environ.get("MAX_SPEAK_COUNT", "6"))
+# 次の話者の選び方の既定（llm | round_robin）。fast プランは常に round_robin
+NEXT_SPEAKER_SELECTION = os.environ.get("NEXT_SPEAKER_SELECTION", "llm")
+# ターンプランの既定（fast | standard | deep）。/chat/stream の plan パラメータで上書き可
+TURN_PLAN = os.environ.get("TURN_PLAN", "standard")
+# 会話の要約（summary_text）の上限（見積もりトークン数）。超えたら古い要約を1文ずつに縮める。
+# 0なら縮めない
+SUMMARY_TOKEN_BUDGET = int(os.environ.get("SUMMARY_TOKEN_BUDGET", "0"))
+# 縮めた要約1件あたりの最大文字数
+SUMMARY_DIGEST_CHARS = int(os.environ.get("SUMMARY_DIGEST_CHARS", "60"))
+# 要約を次の司会ステップと並列に実行するか（クエリパラメータ overlap_summary で上書き可）
+OVERLAP_SUMMARY = os.environ.get("OVERLAP_SUMMARY", "0") == "1"
+
+# Characters
+# キャラクターのプロフィール。起動時に検証し、ファイルが更新されたら再起動せずに読み直す
+CHARACTER_PROFILES_PATH = Path(
+    os.environ.get("CHARACTER_PROFILES_PATH", "character_profiles.json")
+)
+
+# Prompt Registry
+# 取得済みプロンプトの有効期限（秒）。期限切れ後はキャッシュを返しつつ裏で再取得する
+PROMPT_TTL_SECONDS = int(os.environ.get("PROMPT_TTL_SECONDS", "600"))
+# LangSmithに接続できない場合に使う固定スナップショットの保存先
+PROMPT_SNAPSHOT_DIR = Path(os.environ.get("PROMPT_SNAPSHOT_DIR", "prompt_snapshots"))
+# OpenAIのプロンプトキャッシュが効くよう、セッション中変わらない部分をテンプレートの先頭に寄せるか
+PROMPT_PREFIX_LAYOUT = os.environ.get("PROMPT_PREFIX_LAYOUT", "1") == "1"
+
+# Filmarks Scraper
+# filmarks.com への同時リクエスト数の上限
+FILMARKS_MAX_CONCURRENCY = int(os.environ.get("FILMARKS_MAX_CONCURRENCY", "4"))
+# filmarks.com へのリクエスト開始間隔の下限（秒）。負荷軽減のため
+FILMARKS_MIN_INTERVAL = float(os.environ.get("FILMARKS_MIN_INTERVAL", "0.2"))
+# Filmarksのページキャッシュ（SQLite）。再起動後も保持される
+FILMARKS_CACHE_PATH = Path(
+    os.environ.get("FILMARKS_CACHE_PATH", "filmarks_cache.sqlite3")
+)
+# 一覧ページ（上映中・公開予定・ジャンル別）の有効期限（秒）: 既定6時間
+FILMARKS_LIST_TTL = int(os.environ.get("FILMARKS_LIST_TTL", str(6 * 60 * 60)))
+# 作品詳細ページの有効期限（秒）: 既定3日
+FILMARKS_DETAIL_TTL = int(os.environ.get("FILMARKS_DETAIL_TTL", str(3 * 24 * 60 * 60)))
+# Filmarksのトレンド情報を裏で定期取得する間隔（秒）: 既定30分
+FILMARKS_PREFETCH_ENABLED = os.environ.get("FILMARKS_PREFETCH_ENABLED", "1") == "1"
+FILMARKS_PREFETCH_INTERVAL = int(os.environ.get("FILMARKS_PREFETCH_INTERVAL", "1800"))
+# 取得済み結果をそのまま返す期限（秒）。過ぎたら古い結果を返しつつ裏で再取得する
+FILMARKS_PREFETCH_MAX_AGE = int(
+    os.environ.get("FILMARKS_PREFETCH_MAX_AGE", str(FILMARKS_PREFETCH_INTERVAL * 2))
+)
+# TMDb
+# TMDbへの同時リクエスト数の上限
+TMDB_MAX_CONCURRENCY = int(os.environ.get("TMDB_MAX_CONCURRENCY", "8"))
+# TMDbへの1秒あたりのリクエスト数の上限（0なら無制限）
+TMDB_RATE_PER_SEC = float(os.environ.get("TMDB_RATE_PER_SEC", "20"))
+# 検索結果（タイトル→ID）・おすすめ作品・ジャンル一覧のキャッシュ期限（秒）: 既定1日
+TMDB_CACHE_TTL = int(os.environ.get("TMDB_CACHE_TTL", str(24 * 60 * 60)))
+TMDB_CACHE_MAXSIZE = int(os.environ.get("TMDB_CACHE_MAXSIZE", "2048"))
+
+# Governor（utils/governor.py）
+# 全セッション合計での、プロバイダ毎の同時リクエスト数と1秒あたりのリクエスト数の上限（0なら無制限）
+OPENAI_MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_RATE_PER_SEC = float(os.environ.get("OPENAI_RATE_PER_SEC", "8"))
+TAVILY_MAX_CONCURRENCY = int(os.environ.get("TAVILY_MAX_CONCURRENCY", "4"))
+TAVILY_RATE_PER_SEC = float(os.environ.get("TAVILY_RATE_PER_SEC", "2"))
+# 429・5xx・接続エラー時の再試行回数と、バックオフの基準・上限（秒）
+RETRY_ATTEMPTS = int(os.environ.get("RETRY_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.environ.get("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.environ.get("RETRY_MAX_DELAY", "8"))
+# 同時に進める会話の数と、空きを待てる会話の数。溢れたら /chat/stream は busy イベントを返す
+MAX_ACTIVE_SESSIONS = int(os.environ.get("MAX_ACTIVE_SESSIONS", "20"))
+MAX_QUEUED_SESSIONS = int(os.environ.get("MAX_QUEUED_SESSIONS", "20"))
+# 空きを待つ時間の上限（秒）と、busy のときにクライアントへ伝える再接続までの秒数
+SESSION_QUEUE_TIMEOUT = float(os.environ.get("SESSION_QUEUE_TIMEOUT", "10"))
+BUSY_RETRY_AFTER = int(os.environ.get("BUSY_RETRY_AFTER", "5"))
+
+# LLM Cache
+# 応答をキャッシュするテンプレート名（カンマ区切り、例: "summarizer-template,moderator-first-template"）。
+# 空なら無効
+LLM_CACHE_TEMPLATES = {
+    name.strip()
+    for name in os.environ.get("LLM_CACHE_TEMPLATES", "").split(",")
+    if name.strip()
+}
+LLM_CACHE_TTL = int(os.environ.get("LLM_CACHE_TTL", str(6 * 60 * 60)))
+LLM_CACHE_MAXSIZE = int(os.environ.get("LLM_CACHE_MAXSIZE", "1024"))
+# 類似一致で再利用するコサイン類似度の閾値（0なら完全一致のみ）
+LLM_CACHE_SEMANTIC_THRESHOLD = float(
+    os.environ.get("LLM_CACHE_SEMANTIC_THRESHOLD", "0")
+)
+
+# Session / Checkpoint
+# 会話の途中経過（LangGraphのチェックポイント）の保存先: memory | sqlite
+CHECKPOINT_BACKEND = os.environ.get("CHECKPOINT_BACKEND", "memory")
+CHECKPOINT_PATH = Path(os.environ.get("CHECKPOINT_PATH", "checkpoints.sqlite3"))
+# 再接続を受け付ける期間（秒）。過ぎたセッションの送信記録とチェックポイントは削除する
+SESSION_TTL = int(os.environ.get("SESSION_TTL", "1800"))
+# クライアントの切断を確認する間隔（秒）。切断されたら実行中のLLM呼び出し・ツール取得を止める
+DISCONNECT_POLL_INTERVAL = float(os.environ.get("DISCONNECT_POLL_INTERVAL", "0.5"))
+
+# speaker_agent のプロンプトに入れるツール結果の上限（見積もりトークン数）
+TOOL_RESULTS_TOKEN_BUDGET = int(os.environ.get("TOOL_RESULTS_TOKEN_BUDGET", "2000"))
 
 # Logging
 logging.basicConfig(
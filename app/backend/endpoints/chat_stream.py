@@ -1,15 +1,66 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import StreamingResponse
+from datetime import datetime
 import asyncio
 import json
 import logging
-from pathlib import Path
-from graph.chat_graph import build_graph
+import time
+import uuid
+from agents.tools import start_tool_prefetch, cancel_tool_prefetch
+from agents.turn_plan import get_plan
+from config import DISCONNECT_POLL_INTERVAL, OVERLAP_SUMMARY
+from utils.governor import busy_event, session_gate
+from utils.metrics import counter, histogram
+from utils.character_store import get_profiles
+from utils.session_log import get_session, create_session, prune_sessions
 
 router = APIRouter()
 
-with open(Path("character_profiles.json"), "r", encoding="utf-8") as f:
-    ALL_CHARACTER_PROFILES = json.load(f)
+# トークン単位で発言を流すノード（要約はホワイトボード用なので流さない）
+TOKEN_STREAM_NODES = {"moderator", "speaker"}
+
+DISCONNECTS = counter("chat_stream_disconnects_total", "実行中に切断されたストリーム")
+SKIPPED_TURNS = counter(
+    "chat_stream_skipped_turns_total", "切断により実行せずに済んだ残りのターン数"
+)
+FAILED_SESSIONS = counter(
+    "chat_stream_failed_total", "グラフの実行中の例外で打ち切った会話"
+)
+CANCEL_SECONDS = histogram(
+    "chat_stream_cancel_seconds", "切断を検知してからグラフの実行が止まるまでの時間"
+)
+
+
+def turn_id_for(node: str, speak_count: int) -> int:
+    # ターンIDはノードと開始時の発言数から決める（再接続して再実行しても同じIDになる）
+    return 2 * speak_count + (2 if node == "speaker" else 1)
+
+
+async def pump(stream, queue: asyncio.Queue) -> None:
+    """ストリームの送信内容をキューに積む。終わったら（取り消されても）None を積む。"""
+    try:
+        async for text in stream:
+            await queue.put(text)
+    finally:
+        queue.put_nowait(None)
+
+
+async def cancel_and_wait(task: asyncio.Task) -> None:
+    """タスクを取り消し、実行中のLLM呼び出し・HTTPリクエストが止まるまで待つ。"""
+    started = time.perf_counter()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    CANCEL_SECONDS.observe(time.perf_counter() - started)
+
+
+async def watch_disconnect(request: Request, task: asyncio.Task) -> None:
+    # 送信の合間（LLMの応答待ちなど）に切断されても気付けるよう、定期的に確認する
+    while not task.done():
+        if await request.is_disconnected():
+            DISCONNECTS.inc()
+            await cancel_and_wait(task)
+            return
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
 
 
 @router.get("/chat/stream")
@@ -22,68 +73,301 @@ async def chat_stream(request: Request):
     ]  # ←空やスペースも除く
 
     seen_movies = request.query_params.get("seen_movies", "")
-    print(seen_movies)
     characters = request.query_params.get("characters", "")
-    selected_names = characters.split(",")
-    # 選ばれたキャラクターのプロフィール
-    character_profiles = {name: ALL_CHARACTER_PROFILES[name] for name in selected_names}
-    flow = build_graph()  # LangGraph フローの初期化
+    # 同じキャラクターが重複していたら1人にまとめる（選択順は保つ）
+    selected_names = list(
+        dict.fromkeys(name.strip() for name in characters.split(",") if name.strip())
+    )
+    # 知らないキャラクターが含まれるリクエストは、LLMを呼ぶ前に断る
+    profiles = get_profiles()
+    unknown = profiles.unknown(selected_names)
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"unknown characters: {', '.join(unknown)}"
+        )
+    if len(selected_names) < 2:
+        # 司会（最初のキャラ）の他に、話を振る相手が1人は必要（重複を除いて数える）
+        raise HTTPException(
+            status_code=400, detail="at least 2 distinct characters required"
+        )
+    # 選ばれたキャラクターの人物設定（プロンプトにそのまま入れる形で組み立て済み）
+    character_profiles = profiles.persona_inputs(selected_names)
+    # stream_tokens=1 のとき、LLMの生成トークンを逐次 "token" イベントで送信する
+    stream_tokens = request.query_params.get("stream_tokens", "") in ("1", "true")
+    flow = request.app.state.flow  # 起動時にコンパイル済みのLangGraphフロー
+    # セッションIDはフロントエンドが発行する（再接続時に同じ会話の続きを受け取るため）。
+    # セッション毎の設定はグラフのconfig（thread_id）で渡す
+    session_id = request.query_params.get("session_id") or uuid.uuid4().hex
+    # 再接続時はブラウザが最後に受け取ったイベントIDを Last-Event-ID ヘッダで送ってくる
+    try:
+        last_event_id = int(
+            request.headers.get("last-event-id")
+            or request.query_params.get("last_event_id")
+            or 0
+        )
+    except ValueError:
+        # 数値でないID（クライアント・プロキシ由来）は、最初から送り直す扱いにする
+        last_event_id = 0
+    # overlap_summary=1 のとき、発言の要約と次の話者選びを並列に実行する
+    overlap_summary = request.query_params.get("overlap_summary")
+    # plan=fast|standard|deep で、ターン数・ツール・モデル・予算の組み合わせを選ぶ
+    plan = get_plan(request.query_params.get("plan"))
+    session = get_session(session_id)
+    if session is None:
+        await prune_sessions(request.app.state.checkpointer)
+        run_config = {
+            "recursion_limit": plan.recursion_limit,
+            "configurable": {
+                "thread_id": session_id,
+                "turn_plan": plan.name,
+                "overlap_summary": (
+                    overlap_summary in ("1", "true")
+                    if overlap_summary is not None
+                    else OVERLAP_SUMMARY
+                ),
+            },
+        }
+        # プロセス再起動などで記録が無い場合は、クライアントが受け取った続きの番号から振る
+        session = create_session(session_id, run_config, first_id=last_event_id + 1)
 
     async def event_generator():
-        # Stateの初期値の決定
-        state = {
-            "thema": "最近おすすめの映画",
-            "user_message": user_message,
-            "summary": [],
-            "speak_count": 0,
-            "next_speaker": "",
-            "summary_done": False,
-            "last_comment": "",
-            "last_speaker": "",
-            "is_summary": False,
-            "genres": genre_list,
-            "seen_movies": seen_movies,
-            "character_names": selected_names,
-            "character_profiles": character_profiles,
-        }
+        # 同時に進める会話の数を超えたら空きを待ち、待ち行列も一杯なら busy を返してすぐ閉じる
+        if not await session_gate.enter():
+            yield busy_event()
+            return
+        try:
+            # 前の接続がまだグラフを動かしている場合は、終わるのを待ってから続きを実行する
+            async with session.lock:
+                # グラフは別タスクで実行し、クライアントが切断したらタスクごと取り消す
+                # （実行中のLLM呼び出し・ツールのHTTPリクエストも止まる）
+                queue = asyncio.Queue()
+                producer = asyncio.create_task(pump(stream_session(), queue))
+                watcher = asyncio.create_task(watch_disconnect(request, producer))
+                try:
+                    while (text := await queue.get()) is not None:
+                        yield text
+                finally:
+                    watcher.cancel()
+                    if not producer.done():
+                        # 送信に失敗した（切断を先に検知した）場合
+                        DISCONNECTS.inc()
+                        # 応答ごと取り消されている最中でも、グラフが止まるまで見届ける
+                        await asyncio.shield(cancel_and_wait(producer))
+                if not producer.cancelled():
+                    producer.result()  # グラフの実行で起きた例外はここで投げ直す
+        finally:
+            session_gate.leave()
 
-        # フローの実行（LangGraphの状態管理が開始）
-        # 状態が変わるたびにチャット用の内容を yield でフロントへストリーミング送信
-        async for event in flow.astream(state):
-            if await request.is_disconnected():
-                break
+    async def stream_session():
+        run_config = session.run_config
+        # 送信済みで、クライアントが受け取れていないイベントを再送する
+        for text in session.since(last_event_id):
+            yield text
+        if session.done:
+            return
 
-            logging.info(f"event: {event}")
+        yield f"event: session\ndata: {json.dumps({'session_id': session_id})}\n\n"
 
-            # LangGraphから返るeventは常に {ノード名: {...}} の形なので、1階層下を抽出
-            value = next(iter(event.values()))
+        # ターンIDとトークンの話者名を決めるため、実行中のステップ開始時点の値を追う
+        tracked = {"speak_count": 0, "next_speaker": ""}
+        # ターン毎の最初の1バイトまでの時間（TTFB）を計測する起点
+        turn_started_at = time.perf_counter()
+        first_byte_sent = False
 
+        def log_ttfb(turn_id, node):
+            ttfb = time.perf_counter() - turn_started_at
+            logging.info(f"[ttfb] turn={turn_id} node={node} {ttfb:.3f}s")
+
+        def emit(node, value):
+            """ノードの更新を送信用のイベントにして記録する（送信済みのものは除く）。"""
+            texts = []
             message = value.get("last_comment")
             summary = value.get("summary")
             speaker = value.get("last_speaker")
             is_summary = value.get("is_summary")
 
             if message:
+                turn_id = turn_id_for(node, tracked["speak_count"])
+                if not first_byte_sent:
+                    log_ttfb(turn_id, node)
                 payload = {
+                    "turn_id": turn_id,
                     "last_speaker": speaker,  # Noneのときに備えて
                     "text": message,
                     "is_summary": is_summary,
                 }
-                yield f"data: {json.dumps(payload)}\n\n"
+                texts.append(session.add(json.dumps(payload), key=f"turn:{turn_id}"))
 
             if summary:
                 for item in summary:
                     payload = {
                         "last_speaker": item["speaker"],
                         "text": item["text"],
-                        "is_summary": is_summary,
+                        "is_summary": True,
                     }
-                    yield f"data: {json.dumps(payload)}\n\n"
+                    texts.append(
+                        session.add(
+                            json.dumps(payload),
+                            key=f"summary:{tracked['speak_count']}",
+                        )
+                    )
+
+            tracked["speak_count"] = value.get("speak_count", tracked["speak_count"])
+            tracked["next_speaker"] = (
+                value.get("next_speaker") or tracked["next_speaker"]
+            )
+            return [text for text in texts if text]
+
+        saved = await flow.checkpointer.aget_tuple(run_config)
+        if saved is not None:
+            # チェックポイントがあれば、最後に完了したノードの続きから実行する
+            state = None
+            tracked.update(
+                {
+                    key: saved.checkpoint["channel_values"].get(key, default)
+                    for key, default in tracked.items()
+                }
+            )
+            # 最後のチェックポイントから今までは誰も聞いていなかった（切断中）ので、時間の予算から除く
+            paused = (
+                time.time() - datetime.fromisoformat(saved.checkpoint["ts"]).timestamp()
+            )
+            configurable = run_config["configurable"]
+            configurable["paused_seconds"] = (
+                configurable.get("paused_seconds", 0.0) + paused
+            )
+            logging.info(
+                f"[session] {session_id} を speak_count={tracked['speak_count']} から再開"
+                f"（切断 {paused:.1f}s）"
+            )
+            # 実行途中のステップで完了済みのノードは再実行されないので、
+            # 送信前に切断された結果があればここで送る
+            snapshot = await flow.aget_state(run_config)
+            for task in snapshot.tasks:
+                if task.result:
+                    for text in emit(task.name, task.result):
+                        yield text
+            if snapshot.values["next_speaker"] == "no_one":
+                yield session.add("END_OF_STREAM", event="end")
+                session.done = True
+                return
+        else:
+            # Stateの初期値の決定
+            state = {
+                "thema": "最近おすすめの映画",
+                "user_message": user_message,
+                "summary": [],
+                "speak_count": 0,
+                "wrap_up": False,
+                "started_at": time.time(),
+                "spent_tokens": 0,
+                "next_speaker": "",
+                "summary_done": False,
+                "last_comment": "",
+                "last_speaker": "",
+                "is_summary": False,
+                "genres": genre_list,
+                "seen_movies": seen_movies,
+                "character_names": selected_names,
+                "character_profiles": character_profiles,
+            }
+        # 各ターンのツール結果（Tavily・Filmarks・TMDb）を今のうちに並列で取得し始める
+        start_tool_prefetch(
+            session_id,
+            get_plan(run_config["configurable"]["turn_plan"]),
+            genre_list,
+            seen_movies,
+            from_turn=tracked["speak_count"],
+        )
+
+        # ターン毎に、この接続でトークンを送っているLLM呼び出し（メッセージID）。
+        # 新しい呼び出しのトークンが来たら reset を付けて、それまでの表示を置き換えさせる
+        # （再接続前の途中までの表示や、ガバナが再試行する前に送った途中までのトークン）
+        turn_streams = {}
+
+        try:
+            # フローの実行（LangGraphの状態管理が開始）
+            # 状態が変わるたびにチャット用の内容を yield でフロントへストリーミング送信
+            stream_mode = ["updates", "messages"] if stream_tokens else "updates"
+            async for chunk in flow.astream(state, run_config, stream_mode=stream_mode):
+                mode, event = chunk if stream_tokens else ("updates", chunk)
+
+                if mode == "messages":
+                    message_chunk, metadata = event
+                    node = metadata.get("langgraph_node")
+                    if node not in TOKEN_STREAM_NODES or not message_chunk.content:
+                        continue
+                    turn_id = turn_id_for(node, tracked["speak_count"])
+                    if not first_byte_sent:
+                        log_ttfb(turn_id, node)
+                        first_byte_sent = True
+                    payload = {
+                        "turn_id": turn_id,
+                        # 司会は常に最初のキャラ、スピーカーは司会が指名したキャラ
+                        "last_speaker": (
+                            selected_names[0]
+                            if node == "moderator"
+                            else tracked["next_speaker"]
+                        ),
+                        "delta": message_chunk.content,
+                    }
+                    if (
+                        turn_id not in turn_streams
+                        or turn_streams[turn_id] != message_chunk.id
+                    ):
+                        turn_streams[turn_id] = message_chunk.id
+                        payload["reset"] = True
+                    # トークンは再送しない（確定した発言だけ記録する）ので、イベントIDは振らない
+                    yield f"event: token\ndata: {json.dumps(payload)}\n\n"
+                    continue
+
+                # LangGraphから返るeventは常に {ノード名: {...}} の形なので、1階層下を抽出
+                node, value = next(iter(event.items()))
+                # State全体は出さず、ノード毎の要点だけを記録する
+                logging.info(
+                    f"[event] session={session_id} node={node} "
+                    f"speak_count={value.get('speak_count', tracked['speak_count'])} "
+                    f"speaker={value.get('last_speaker', '')} "
+                    f"chars={len(value.get('last_comment') or '')} "
+                    f"tokens={value.get('spent_tokens', 0)}"
+                )
+                for text in emit(node, value):
+                    yield text
+
+                # 次のノードの実行開始 = 次のターンのTTFB計測開始
+                turn_started_at = time.perf_counter()
+                first_byte_sent = False
 
-            await asyncio.sleep(0.3)  # 一気にメッセージが出ないようにちょっと待つ
+                if not stream_tokens:
+                    # 一気にメッセージが出ないようにちょっと待つ
+                    await asyncio.sleep(0.3)
 
-        # SSEの終了をフロントエンドに伝える
-        yield "event: end\ndata: END_OF_STREAM\n\n"
+            # SSEの終了をフロントエンドに伝える
+            yield session.add("END_OF_STREAM", event="end")
+            session.done = True
+        except asyncio.CancelledError:
+            # 切断で打ち切った残りのターン（再接続されればチェックポイントから再開する）
+            plan = get_plan(run_config["configurable"]["turn_plan"])
+            SKIPPED_TURNS.inc(
+                max(
+                    0,
+                    min(len(plan.turns), len(plan.turns) - tracked["speak_count"] + 1),
+                )
+            )
+            raise
+        except Exception:
+            # 再接続しても同じノードで失敗する（認証エラー・外部サービスの障害など）ので、
+            # error イベントを記録して会話を終える（再接続時もこのイベントを再送する）
+            logging.exception(f"[session] {session_id} の実行に失敗")
+            FAILED_SESSIONS.inc()
+            yield session.add(
+                json.dumps({"message": "会話の生成中にエラーが発生しました"}),
+                event="error",
+            )
+            session.done = True
+        finally:
+            # 使われなかったツールの先読みを止める
+            cancel_tool_prefetch(session_id)
 
     return StreamingResponse(
         event_generator(),
@@ -1,26 +1,53 @@
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
 from state_types import AppState
 from agents.moderator import moderator
 from agents.speaker import speaker_agent
-from agents.summarizer import summarizer_agent
+from agents.summarizer import summarizer_agent, overlap_summary_enabled
+from utils.tracing import traced_node
 
 
 # --- フロー分岐 ---
-def route_next(state: AppState):
+# overlap_summary が有効な場合、発言の要約（summarizer）と次の話者選び（moderator）を
+# 同じステップで並列に実行する。最後の発言だけは、司会のまとめが全要約を使えるよう
+# 要約 → 司会 の順に実行する。
+def route_next(state: AppState, config: RunnableConfig):
     if state["next_speaker"] == "no_one":
         return "end"
+    elif overlap_summary_enabled(config):
+        # 並列実行中は要約側の summary_done が見えないので、冒頭発言かどうかで分岐する
+        if not state["next_speaker"] and not state["wrap_up"]:
+            # 司会の冒頭発言の要約と、最初の話者選びを並列に
+            return ["summarize", "moderate"]
+        elif not state["next_speaker"]:
+            return "summarize"
+        return "speak"
     elif not state["summary_done"]:
         return "summarize"
     else:
         return "speak"
 
 
+def route_after_speak(state: AppState, config: RunnableConfig):
+    if overlap_summary_enabled(config) and not state["wrap_up"]:
+        return ["summarize", "moderate"]
+    return "summarize"
+
+
+def route_after_summarize(state: AppState, config: RunnableConfig):
+    if overlap_summary_enabled(config) and not state["wrap_up"]:
+        # 司会は並列に進んでいるので、要約はここで終わり（結果はsummaryに合流する）
+        return "end"
+    return "moderate"
+
+
 # --- LangGraph構築 ---
-def build_graph():
+def build_graph(checkpointer=None):
     graph = StateGraph(AppState)
-    graph.add_node("moderator", moderator)
-    graph.add_node("speaker", speaker_agent)
-    graph.add_node("summarizer", summarizer_agent)
+    # 各ノードの所要時間はターン毎に /metrics の graph_node_seconds に記録する
+    graph.add_node("moderator", traced_node("moderator", moderator))
+    graph.add_node("speaker", traced_node("speaker", speaker_agent))
+    graph.add_node("summarizer", traced_node("summarizer", summarizer_agent))
     graph.set_entry_point("moderator")
 
     # ▼ 条件分岐
@@ -28,16 +55,27 @@ def build_graph():
     # - summary_done が False → summarizer に移動して要約
     # - summary_done が True → speaker に移動して次の発言
     # - next_speaker == no_one → 会話終了
+    # overlap_summary 有効時は speaker の後に summarizer と moderator を並列実行する
     graph.add_conditional_edges(
         "moderator",
         route_next,
         {
             "speak": "speaker",
             "summarize": "summarizer",
+            "moderate": "moderator",
             "end": END,
         },
     )
-    graph.add_edge("speaker", "summarizer")
-    graph.add_edge("summarizer", "moderator")
+    graph.add_conditional_edges(
+        "speaker",
+        route_after_speak,
+        {"summarize": "summarizer", "moderate": "moderator"},
+    )
+    graph.add_conditional_edges(
+        "summarizer",
+        route_after_summarize,
+        {"moderate": "moderator", "end": END},
+    )
     # LangGraphのフローをコンパイル（ここではまだ実行しない）
-    return graph.compile()
+    # checkpointer を渡すと、ステップ毎の状態が thread_id（セッションID）単位で保存される
+    return graph.compile(checkpointer=checkpointer)
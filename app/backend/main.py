@@ -1,8 +1,38 @@
+from contextlib import asynccontextmanager, AsyncExitStack
+import asyncio
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from endpoints.chat_stream import router as chat_router
+from graph.chat_graph import build_graph
+from utils.character_store import get_profiles
+from utils.checkpointer import open_checkpointer
+from utils.metrics import render as render_metrics
+from utils.prompt_registry import warm_prompts
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from utils.filmarks_prefetch import start_prefetch, stop_prefetch
+    from utils.http_client import close_http_client
+
+    # キャラクターのプロフィールは起動時に検証する（不正な内容なら起動しない）
+    get_profiles()
+    # LangSmithのプロンプトは起動を待たせずに裏でまとめて取得しておく
+    app.state.warm_prompts = asyncio.create_task(asyncio.to_thread(warm_prompts))
+    async with AsyncExitStack() as stack:
+        # 再接続時に途中から再開できるよう、会話の途中経過をチェックポイントに残す
+        app.state.checkpointer = await stack.enter_async_context(open_checkpointer())
+        # LangGraphのフローはプロセスで1回だけコンパイルし、全リクエストで共有する
+        app.state.flow = build_graph(app.state.checkpointer)
+        # Filmarksのトレンド情報を裏で定期取得しておく
+        start_prefetch()
+        yield
+        await stop_prefetch()
+        await close_http_client()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -13,3 +43,17 @@ app.add_middleware(
 )
 
 app.include_router(chat_router)
+
+
+# 起動確認用（コールドスタート計測でも使用）
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+# Prometheus形式のメトリクス（ノード・外部呼び出しの所要時間、トークン数、キャッシュの当たり外れなど）
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(
+        render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -1,5 +1,6 @@
 from typing import Annotated, List, TypedDict
 import operator
+from utils.transcript import Transcript, append_summary
 
 
 class AppState(TypedDict):
@@ -12,13 +13,23 @@ class AppState(TypedDict):
     character_names: List[
         str
     ]  # ユーザがフォームで入力した内容。クエリパラメータで受け取り、司会L、スピーカーに読み込ませる。
-    character_profiles: dict[str, dict[str, str]]
+    character_profiles: dict[
+        str, dict[str, str]
+    ]  # キャラ名毎の人物設定（プロンプトの name/gender/age/job/hobby/personality）。utils/character_store.py で組み立て済み
     last_speaker: str  # 直前の発言者
     last_comment: str  # 直前の発言内容（要約エージェントがこれを要約する）
-    summary: Annotated[
-        List[dict], operator.add
-    ]  # 要約された発言のリスト（司会が最後のまとめに使う）。要約結果に発言者の名前を含むようdict型にする。
-    speak_count: int  # 全体の発言数（MAX_SPEAK_COUNT で上限をチェック）
+    summary: List[
+        dict
+    ]  # 直前に要約された発言（フロントエンドへの送信用）。要約結果に発言者の名前を含むようdict型にする。
+    transcript: Annotated[
+        Transcript, append_summary
+    ]  # これまでの要約を描画済みテキストとして積み上げたもの（司会・speakerの summary_text）。
+    speak_count: (
+        int  # 全体の発言数（speaker のターンは agents/turn_plan.py のプランで決まる）
+    )
+    wrap_up: bool  # 次は締めの発言か（プランのターンを使い切った、または予算切れ）
+    started_at: float  # セッション開始時刻（time.time()）。時間の予算の計算に使用（切断中の時間は除く）
+    spent_tokens: Annotated[int, operator.add]  # これまでのLLM呼び出しの合計トークン数
     next_speaker: str  # 次に話すキャラクターの名前（司会が決める）
     summary_done: bool  # 直前の発言が要約済みかどうか（Trueなら要約済、Falseなら要約未） LangGraphのグラフ遷移判定に使用
     is_summary: bool  # このメッセージが要約文であるか否か　フロントエンドのホワイトボードへの記載要否を制御
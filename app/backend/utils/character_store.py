@@ -0,0 +1,101 @@
+# --- utils/character_store.py ---
+# キャラクターのプロフィール（character_profiles.json）の置き場所。
+# - 読み込み時に全キャラの項目を検証し、プロンプトに入れる人物設定をキャラ毎に組み立てておく
+# - ファイルの更新時刻が変わったら読み直す（検証に失敗したら前の内容を使い続ける）
+# 会話中のターンは chat_stream がStateに入れた人物設定を使うので、途中で読み直しても変わらない。
+from dataclasses import dataclass
+import json
+import logging
+import os
+import threading
+from types import MappingProxyType
+from typing import Mapping
+
+from config import CHARACTER_PROFILES_PATH
+
+# プロンプトの入力名: character_profiles.json の項目名
+PROFILE_FIELDS = {
+    "gender": "性別",
+    "age": "年齢",
+    "job": "職業",
+    "hobby": "趣味",
+    "personality": "性格",
+}
+
+
+@dataclass(frozen=True, slots=True)
+class Persona:
+    name: str
+    inputs: Mapping[str, str]  # プロンプトの name/gender/age/job/hobby/personality
+
+
+@dataclass(frozen=True, slots=True)
+class ProfileStore:
+    personas: Mapping[str, Persona]
+    mtime_ns: int
+
+    def unknown(self, names: list[str]) -> list[str]:
+        return [name for name in names if name not in self.personas]
+
+    def persona_inputs(self, names: list[str]) -> dict[str, dict[str, str]]:
+        """Stateに入れる {キャラ名: 人物設定}。チェックポイントに保存できるよう dict で返す。"""
+        return {name: dict(self.personas[name].inputs) for name in names}
+
+
+_store = None
+_lock = threading.Lock()
+
+
+def _persona(name, profile) -> Persona:
+    if not isinstance(profile, dict):
+        raise ValueError(f"{name}: プロフィールがオブジェクトではありません")
+    missing = [
+        field
+        for field in PROFILE_FIELDS.values()
+        if not isinstance(profile.get(field), str) or not profile[field].strip()
+    ]
+    if missing:
+        raise ValueError(f"{name}: {', '.join(missing)} がありません")
+    inputs = {"name": name}
+    inputs.update({key: profile[field] for key, field in PROFILE_FIELDS.items()})
+    return Persona(name, MappingProxyType(inputs))
+
+
+def load_profiles() -> ProfileStore:
+    """character_profiles.json を読んで検証する。不正な内容なら ValueError。"""
+    mtime_ns = os.stat(CHARACTER_PROFILES_PATH).st_mtime_ns
+    with open(CHARACTER_PROFILES_PATH, "r", encoding="utf-8") as f:
+        profiles = json.load(f)
+    if not isinstance(profiles, dict) or not profiles:
+        raise ValueError(f"{CHARACTER_PROFILES_PATH}: キャラクターがありません")
+    personas = {name: _persona(name, profile) for name, profile in profiles.items()}
+    return ProfileStore(MappingProxyType(personas), mtime_ns)
+
+
+def get_profiles() -> ProfileStore:
+    global _store
+    with _lock:
+        if _store is None:
+            # 初回（起動時）は不正な内容ならそのまま失敗させる
+            _store = load_profiles()
+            return _store
+        try:
+            mtime_ns = os.stat(CHARACTER_PROFILES_PATH).st_mtime_ns
+        except OSError as e:
+            logging.warning(f"[characters] プロフィールを確認できません: {e}")
+            return _store
+        if mtime_ns == _store.mtime_ns:
+            return _store
+        try:
+            _store = load_profiles()
+            logging.info(
+                f"[characters] プロフィールを読み直しました: {len(_store.personas)}人"
+            )
+        except (OSError, ValueError) as e:
+            # json.JSONDecodeError も ValueError に含まれる
+            logging.error(
+                f"[characters] プロフィールの読み直しに失敗したため前の内容を使用: {e}"
+            )
+            # 同じ内容を何度も読み直さないよう、確認した更新時刻は記録しておく
+            _store = ProfileStore(_store.personas, mtime_ns)
+        return _store
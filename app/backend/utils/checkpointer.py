@@ -0,0 +1,25 @@
+# --- utils/checkpointer.py ---
+# LangGraphのチェックポイントの保存先。既定はメモリ上（プロセス再起動で消える）。
+# CHECKPOINT_BACKEND=sqlite なら CHECKPOINT_PATH のSQLiteに保存する
+# （langgraph-checkpoint-sqlite が必要。無ければメモリ上にする）。
+from contextlib import asynccontextmanager
+import logging
+from langgraph.checkpoint.memory import MemorySaver
+from config import CHECKPOINT_BACKEND, CHECKPOINT_PATH
+
+
+@asynccontextmanager
+async def open_checkpointer():
+    if CHECKPOINT_BACKEND != "sqlite":
+        yield MemorySaver()
+        return
+    try:
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+    except ImportError:
+        logging.warning(
+            "[checkpoint] langgraph-checkpoint-sqlite が無いためメモリ上に保存します"
+        )
+        yield MemorySaver()
+        return
+    async with AsyncSqliteSaver.from_conn_string(str(CHECKPOINT_PATH)) as saver:
+        yield saver
@@ -1,242 +1,180 @@
-import requests
-from bs4 import BeautifulSoup
-import time
+import asyncio
 from datetime import datetime, timedelta
+import logging
 import re
-
-
-BASE_URL = "https://filmarks.com"
+import httpx
+from config import (
+    FILMARKS_CACHE_PATH,
+    FILMARKS_LIST_TTL,
+    FILMARKS_DETAIL_TTL,
+)
+from utils import governor
+from utils.page_cache import PageCache
+from utils.filmarks_parser import BASE_URL, parse_list, parse_detail
+from utils.http_client import get_http_client
+from utils.tracing import span
+from utils.movie_record import MovieRecord
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4430.212 Safari/537.36"
 }
 
+GENRE_MAP = {
+    "アクション": 5,
+    "コメディ": 20,
+    "ドラマ": 8,
+    "ホラー": 17,
+    "SF": 42,
+    "アニメ": 61,
+    "ファンタジー": 56,
+    "恋愛": 25,
+    "ドキュメンタリー": 12,
+    "サスペンス": 2,
+}
 
-def get_detail_from_meta(detail_url: str) -> tuple[str, str, str]:
-    try:
-        res = requests.get(detail_url, headers=HEADERS)
-        soup = BeautifulSoup(res.text, "html.parser")
-
-        # あらすじ
-        meta_tag = soup.find("meta", attrs={"name": "description"})
-        description = "あらすじ記載なし"
-        if meta_tag and meta_tag.get("content"):
-            description = meta_tag["content"].strip()
-            split_keywords = [
-                "、内容・ネタバレ、あらすじ、予告編・予告動画、公開映画館情報、公開スケジュール、監督・出演者の関連映画情報",
-                "件のレビュー(口コミ・感想・評価)",
-            ]
-            for keyword in split_keywords:
-                if keyword in description:
-                    description = description.split(keyword)[-1].strip()
-
-        # ポスター画像（div.c2-poster-l 内の img の src を取得）
-        poster_container = soup.find("div", class_="c2-poster-l")
-        poster_tag = poster_container.find("img") if poster_container else None
-        poster_url = (
-            poster_tag["src"].strip()
-            if poster_tag and poster_tag.get("src")
-            else "ポスターURLなし"
-        )
 
-        # 予告編動画
-        trailer_section = soup.find(
-            "div", class_="p-content-detail-related-info__box-trailer-video"
-        )
-        iframe_tag = trailer_section.find("iframe") if trailer_section else None
-        trailer_url = (
-            iframe_tag["src"].strip()
-            if iframe_tag and iframe_tag.get("src")
-            else "予告編URLなし"
+_cache = None
+
+
+# SQLiteのキャッシュは初回の取得時に開く
+def _get_cache() -> PageCache:
+    global _cache
+    if _cache is None:
+        # どちらの有効期限も過ぎた行は消す（HTMLの本文を持ち続けないように）
+        _cache = PageCache(
+            FILMARKS_CACHE_PATH, max(FILMARKS_LIST_TTL, FILMARKS_DETAIL_TTL)
         )
+    return _cache
+
+
+async def _request(url: str) -> httpx.Response:
+    # 429・5xx は例外にしてガバナに再試行させる
+    return governor.raise_for_retryable(
+        await get_http_client().get(url, headers=HEADERS)
+    )
+
+
+async def _download(url: str) -> tuple[str, bool]:
+    # keep-aliveの共有クライアントを使い、ガバナの上限（同時接続数・開始間隔）の範囲内で取得する
+    async with span("filmarks", name="page") as s:
+        res = await governor.call("filmarks", _request, url, span=s)
+    # 正常に取得できたページだけをキャッシュする
+    return res.text, res.status_code == 200
+
+
+async def _download_list(url: str) -> tuple[str, bool]:
+    # 200でも作品が1件も無いページ（混雑時のページなど）はキャッシュしない。
+    # キャッシュすると、サイトが復旧しても有効期限まで空の一覧を返し続けるため
+    html, ok = await _download(url)
+    return html, ok and bool(parse_list(html))
 
-        return description, poster_url, trailer_url
+
+# 一覧ページと詳細ページで有効期限を分けてキャッシュから取得する
+async def _get_page(url: str, ttl: float, loader=_download) -> str:
+    return await _get_cache().fetch(url, ttl, loader)
+
+
+async def get_detail_from_meta(detail_url: str) -> tuple[str, str, str]:
+    try:
+        html = await _get_page(detail_url, FILMARKS_DETAIL_TTL)
+        # あらすじ・ポスター画像・予告編動画
+        return parse_detail(html)
 
     except Exception as e:
-        print(f"[ERROR] {detail_url} の取得に失敗しました: {e}")
+        logging.warning(f"[filmarks] {detail_url} の取得に失敗しました: {e!r}")
         return "あらすじ記載なし", "ポスターURLなし", "予告編URLなし"
 
 
-# 最大10本まで上映中の映画の情報を取得する
-# nowで上映中の映画を取得するか、公開予定の映画を取得するか選択する
-def fetch_filmarks_movies(limit: int = 10, now: bool = True) -> list[str]:
+# スコアが4.0以上の作品だけを残す（数値でない場合もスキップ）
+def is_high_score(score: str) -> bool:
     try:
-        # 上映中 or 公開予定の映画URLを切り替え
-        if now:
-            # 上映中の映画一覧
-            list_url = f"{BASE_URL}/list/now"
-        else:
-            # 公開予定の映画一覧
-            list_url = f"{BASE_URL}/list/coming"
-
-        res = requests.get(list_url, headers=HEADERS)
-        soup = BeautifulSoup(res.content, "html.parser")
-        movies = soup.find_all("div", class_="js-cassette")
-        results = []
-        for count, movie in enumerate(movies):
-            if count >= limit:
-                break
-            title_tag = movie.find("h3", class_="p-content-cassette__title")
-            title = title_tag.text.strip() if title_tag else "タイトル記載なし"
-
-            genre_list = []
-            genres_section = movie.find("ul", class_="genres")
-            if genres_section:
-                genre_list = [li.text.strip() for li in genres_section.find_all("li")]
-
-            release_info = movie.find("div", class_="p-content-cassette__info-main")
-            release_date = "公開日不明"
-            if release_info:
-                span = release_info.find("span")
-                if span:
-                    release_date = span.text.strip()
-
-            score_tag = movie.find("div", class_="c-rating__score")
-            score = score_tag.text.strip() if score_tag else "スコアなし"
-
-            try:
-                score_value = float(score)
-                if score_value < 4.0:
-                    continue  # 4.0未満はスキップ
-            except ValueError:
-                continue  # 数値でない場合もスキップ
-
-            readmore_tag = movie.find("a", class_="p-content-cassette__readmore")
-            if readmore_tag and readmore_tag.get("href"):
-                detail_url = BASE_URL + readmore_tag["href"]
-                time.sleep(0.5)  # 負荷軽減のためスリープ
-                synopsis, poster_url, trailer_url = get_detail_from_meta(detail_url)
-
-                movie_text = (
-                    f"【映画{count + 1}】\n"
-                    f"タイトル: {title}\n"
-                    f"ジャンル: {', '.join(genre_list) if genre_list else 'ジャンル記載なし'}\n"
-                    f"公開日: {release_date}\n"
-                    f"評価スコア: {score}\n"
-                    f"あらすじ: {synopsis}\n"
-                    f"ポスター: {poster_url}\n"
-                    f"予告編: {trailer_url}"
-                )
-
-            results.append(movie_text)
-        return results
-    except Exception as e:
-        return [f"Filmarksの取得に失敗しました: {str(e)}"]
-
-
-# 指定されたジャンルの過去作も含めた映画情報を取得する。
-def fetch_filmarks_movies_by_genres(
-    genres: list[str], limit_per_genre: int = 5
-) -> list[str]:
-    genre_map = {
-        "アクション": 5,
-        "コメディ": 20,
-        "ドラマ": 8,
-        "ホラー": 17,
-        "SF": 42,
-        "アニメ": 61,
-        "ファンタジー": 56,
-        "恋愛": 25,
-        "ドキュメンタリー": 12,
-        "サスペンス": 2,
-    }
-
-    all_results = []
-    today = datetime.today().date()
-    cutoff_date = today - timedelta(days=180)
-
-    for genre_name in genres:
-        genre_id = genre_map.get(genre_name)
-        if genre_id is None:
-            all_results.append(f"▼ジャンル「{genre_name}」は未対応です。")
+        return float(score) >= 4.0
+    except ValueError:
+        return False
+
+
+# 「YYYY年M月D日」形式の公開日をパースする
+def parse_release_date(release_date: str):
+    match = re.search(r"(\d{4})年(\d{1,2})月(\d{1,2})日", release_date)
+    if not match:
+        return None
+    year, month, day = map(int, match.groups())
+    return datetime(year, month, day).date()
+
+
+async def fetch_cassettes(list_url: str) -> list[dict]:
+    html = await _get_page(list_url, FILMARKS_LIST_TTL, _download_list)
+    cassettes = parse_list(html)
+    # 一覧が空なのはエラーページ（403・404や混雑時のページなど）。取得の失敗として扱う
+    if not cassettes:
+        raise ValueError(f"{list_url} から作品一覧を取得できませんでした")
+    return cassettes
+
+
+async def _detail_or_default(detail_url):
+    if detail_url is None:
+        return "あらすじ記載なし", "ポスターURLなし", "予告編URLなし"
+    return await get_detail_from_meta(detail_url)
+
+
+# 作品一覧の詳細ページを並列に取得して、映画レコードにする
+async def build_records(items: list[dict], group: str = "") -> list[MovieRecord]:
+    details = await asyncio.gather(
+        *(_detail_or_default(item["detail_url"]) for item in items)
+    )
+    return [
+        MovieRecord(
+            source="filmarks",
+            group=group,
+            title=item["title"],
+            genres=tuple(item["genre_list"]),
+            release_date=item["release_date"],
+            score=item["score"],
+            synopsis=synopsis,
+            poster_url=poster_url,
+            trailer_url=trailer_url,
+        )
+        for item, (synopsis, poster_url, trailer_url) in zip(items, details)
+    ]
+
+
+# 上映中 or 公開予定の映画を取得する（失敗時は例外を送出する）
+async def load_filmarks_movies(limit: int = 10, now: bool = True) -> list[MovieRecord]:
+    # 上映中 or 公開予定の映画URLを切り替え
+    if now:
+        # 上映中の映画一覧
+        list_url = f"{BASE_URL}/list/now"
+    else:
+        # 公開予定の映画一覧
+        list_url = f"{BASE_URL}/list/coming"
+
+    cassettes = await fetch_cassettes(list_url)
+    # 一覧の先頭limit件のうち、評価4.0以上のものだけ詳細を取得する
+    items = [item for item in cassettes[:limit] if is_high_score(item["score"])]
+    return await build_records(items)
+
+
+# 1ジャンル分の過去作（公開から半年以上経過・評価4.0以上）を取得する（失敗時は例外を送出する）
+async def load_filmarks_genre(
+    genre_name: str, limit_per_genre: int = 5
+) -> list[MovieRecord | str]:
+    genre_id = GENRE_MAP.get(genre_name)
+    if genre_id is None:
+        return [f"▼ジャンル「{genre_name}」は未対応です。"]
+
+    list_url = f"{BASE_URL}/list/genre/{genre_id}"
+    cutoff_date = datetime.today().date() - timedelta(days=180)
+
+    items = []
+    for item in await fetch_cassettes(list_url):
+        if len(items) >= limit_per_genre:
+            break
+        release_date_obj = parse_release_date(item["release_date"])
+        # 公開日が不明または半年前以降（新しすぎ）はスキップ
+        if not release_date_obj or release_date_obj > cutoff_date:
+            continue
+        if not is_high_score(item["score"]):
             continue
+        items.append(item)
 
-        list_url = f"{BASE_URL}/list/genre/{genre_id}"
-
-        try:
-            res = requests.get(list_url, headers=HEADERS)
-            soup = BeautifulSoup(res.content, "html.parser")
-            movies = soup.find_all("div", class_="js-cassette")
-
-            genre_results = [f"■ジャンル: {genre_name}"]
-            count = 0
-
-            for movie in movies:
-                if count >= limit_per_genre:
-                    break
-
-                title_tag = movie.find("h3", class_="p-content-cassette__title")
-                title = title_tag.text.strip() if title_tag else "タイトル記載なし"
-
-                genre_list = []
-                genres_section = movie.find("ul", class_="genres")
-                if genres_section:
-                    genre_list = [
-                        li.text.strip() for li in genres_section.find_all("li")
-                    ]
-
-                release_info = movie.find("div", class_="p-content-cassette__info-main")
-                release_date = "公開日不明"
-                release_date_obj = None
-                if release_info:
-                    span = release_info.find("span")
-                    if span:
-                        release_date = span.text.strip()
-                        # 「YYYY年M月D日」形式の文字列をパース
-                        match = re.search(
-                            r"(\d{4})年(\d{1,2})月(\d{1,2})日", release_date
-                        )
-                        if match:
-                            year, month, day = map(int, match.groups())
-                            release_date_obj = datetime(year, month, day).date()
-
-                # 公開日が不明または半年前以降（新しすぎ）はスキップ
-                if not release_date_obj or release_date_obj > cutoff_date:
-                    continue
-
-                score_tag = movie.find("div", class_="c-rating__score")
-                score = score_tag.text.strip() if score_tag else "スコアなし"
-
-                try:
-                    score_value = float(score)
-                    if score_value < 4.0:
-                        continue
-                except ValueError:
-                    continue
-
-                readmore_tag = movie.find("a", class_="p-content-cassette__readmore")
-                if readmore_tag and readmore_tag.get("href"):
-                    detail_url = BASE_URL + readmore_tag["href"]
-                    time.sleep(0.5)
-                    synopsis, poster_url, trailer_url = get_detail_from_meta(detail_url)
-
-                movie_text = (
-                    f"【映画{count + 1}】\n"
-                    f"タイトル: {title}\n"
-                    f"ジャンル: {', '.join(genre_list) if genre_list else 'ジャンル記載なし'}\n"
-                    f"公開日: {release_date}\n"
-                    f"評価スコア: {score}\n"
-                    f"あらすじ: {synopsis}\n"
-                    f"ポスター: {poster_url}\n"
-                    f"予告編: {trailer_url}"
-                )
-
-                genre_results.append(movie_text)
-                count += 1
-
-            if count > 0:
-                all_results.extend(genre_results)
-
-        except Exception as e:
-            all_results.append(
-                f"ジャンル「{genre_name}」の取得に失敗しました: {str(e)}"
-            )
-
-    return all_results
-
-
-print(fetch_filmarks_movies_by_genres(["SF", "ホラー"], 2))
-print("****************")
-print(fetch_filmarks_movies(2, True))
-print(fetch_filmarks_movies(2, False))
-print("****************")
+    return await build_records(items, group=f"■ジャンル: {genre_name}")
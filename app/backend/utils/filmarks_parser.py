@@ -0,0 +1,192 @@
+# --- utils/filmarks_parser.py ---
+# FilmarksのHTMLパーサ。lxmlがあればlxml（XPath）で必要な要素だけを読み、
+# 無ければ従来どおりBeautifulSoup（html.parser）で読む。どちらも同じ結果を返す。
+try:
+    import lxml.html
+except ImportError:  # lxml が入っていない環境ではBeautifulSoupを使う
+    lxml = None
+
+BASE_URL = "https://filmarks.com"
+
+DESCRIPTION_KEYWORDS = [
+    "、内容・ネタバレ、あらすじ、予告編・予告動画、公開映画館情報、公開スケジュール、監督・出演者の関連映画情報",
+    "件のレビュー(口コミ・感想・評価)",
+]
+DEFAULT_DETAIL = ("あらすじ記載なし", "ポスターURLなし", "予告編URLなし")
+
+
+def _clean_description(content) -> str:
+    description = "あらすじ記載なし"
+    if content:
+        description = content.strip()
+        for keyword in DESCRIPTION_KEYWORDS:
+            if keyword in description:
+                description = description.split(keyword)[-1].strip()
+    return description
+
+
+def _cassette(title, genre_list, release_date, score, href) -> dict:
+    return {
+        "title": title,
+        "genre_list": genre_list,
+        "release_date": release_date,
+        "score": score,
+        "detail_url": BASE_URL + href if href else None,
+    }
+
+
+# --- BeautifulSoup版 ---
+
+
+def parse_list_soup(html: str) -> list[dict]:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    results = []
+    for movie in soup.find_all("div", class_="js-cassette"):
+        title_tag = movie.find("h3", class_="p-content-cassette__title")
+        title = title_tag.text.strip() if title_tag else "タイトル記載なし"
+
+        genre_list = []
+        genres_section = movie.find("ul", class_="genres")
+        if genres_section:
+            genre_list = [li.text.strip() for li in genres_section.find_all("li")]
+
+        release_info = movie.find("div", class_="p-content-cassette__info-main")
+        release_date = "公開日不明"
+        if release_info:
+            span = release_info.find("span")
+            if span:
+                release_date = span.text.strip()
+
+        score_tag = movie.find("div", class_="c-rating__score")
+        score = score_tag.text.strip() if score_tag else "スコアなし"
+
+        readmore_tag = movie.find("a", class_="p-content-cassette__readmore")
+        href = readmore_tag.get("href") if readmore_tag else None
+
+        results.append(_cassette(title, genre_list, release_date, score, href))
+    return results
+
+
+def parse_detail_soup(html: str) -> tuple[str, str, str]:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+
+    # あらすじ
+    meta_tag = soup.find("meta", attrs={"name": "description"})
+    description = _clean_description(meta_tag.get("content") if meta_tag else None)
+
+    # ポスター画像（div.c2-poster-l 内の img の src を取得）
+    poster_container = soup.find("div", class_="c2-poster-l")
+    poster_tag = poster_container.find("img") if poster_container else None
+    poster_url = (
+        poster_tag["src"].strip()
+        if poster_tag and poster_tag.get("src")
+        else "ポスターURLなし"
+    )
+
+    # 予告編動画
+    trailer_section = soup.find(
+        "div", class_="p-content-detail-related-info__box-trailer-video"
+    )
+    iframe_tag = trailer_section.find("iframe") if trailer_section else None
+    trailer_url = (
+        iframe_tag["src"].strip()
+        if iframe_tag and iframe_tag.get("src")
+        else "予告編URLなし"
+    )
+
+    return description, poster_url, trailer_url
+
+
+# --- lxml版 ---
+
+
+# class属性に指定のクラスを含む要素を選ぶXPath条件
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+XPATH_CASSETTE = f"//div[{_has_class('js-cassette')}]"
+XPATH_TITLE = f"(.//h3[{_has_class('p-content-cassette__title')}])[1]"
+XPATH_GENRES = f"(.//ul[{_has_class('genres')}])[1]//li"
+XPATH_RELEASE = f"(.//div[{_has_class('p-content-cassette__info-main')}])[1]"
+XPATH_SCORE = f"(.//div[{_has_class('c-rating__score')}])[1]"
+XPATH_READMORE = f"(.//a[{_has_class('p-content-cassette__readmore')}])[1]"
+XPATH_DESCRIPTION = "(//meta[@name='description'])[1]"
+XPATH_POSTER = f"(//div[{_has_class('c2-poster-l')}])[1]"
+XPATH_TRAILER = (
+    f"(//div[{_has_class('p-content-detail-related-info__box-trailer-video')}])[1]"
+)
+
+
+def _first(node, xpath: str):
+    found = node.xpath(xpath)
+    return found[0] if found else None
+
+
+def _first_attr(node, xpath: str, tag: str, attr: str) -> str | None:
+    container = _first(node, xpath)
+    if container is None:
+        return None
+    element = _first(container, f"(.//{tag})[1]")
+    return element.get(attr) if element is not None else None
+
+
+def parse_list_lxml(html: str) -> list[dict]:
+    tree = lxml.html.fromstring(html)
+    results = []
+    for movie in tree.xpath(XPATH_CASSETTE):
+        title_tag = _first(movie, XPATH_TITLE)
+        title = (
+            title_tag.text_content().strip()
+            if title_tag is not None
+            else "タイトル記載なし"
+        )
+
+        genre_list = [li.text_content().strip() for li in movie.xpath(XPATH_GENRES)]
+
+        release_info = _first(movie, XPATH_RELEASE)
+        release_date = "公開日不明"
+        if release_info is not None:
+            span = _first(release_info, "(.//span)[1]")
+            if span is not None:
+                release_date = span.text_content().strip()
+
+        score_tag = _first(movie, XPATH_SCORE)
+        score = (
+            score_tag.text_content().strip() if score_tag is not None else "スコアなし"
+        )
+
+        readmore_tag = _first(movie, XPATH_READMORE)
+        href = readmore_tag.get("href") if readmore_tag is not None else None
+
+        results.append(_cassette(title, genre_list, release_date, score, href))
+    return results
+
+
+def parse_detail_lxml(html: str) -> tuple[str, str, str]:
+    tree = lxml.html.fromstring(html)
+
+    meta_tag = _first(tree, XPATH_DESCRIPTION)
+    description = _clean_description(
+        meta_tag.get("content") if meta_tag is not None else None
+    )
+
+    poster_src = _first_attr(tree, XPATH_POSTER, "img", "src")
+    poster_url = poster_src.strip() if poster_src else "ポスターURLなし"
+
+    trailer_src = _first_attr(tree, XPATH_TRAILER, "iframe", "src")
+    trailer_url = trailer_src.strip() if trailer_src else "予告編URLなし"
+
+    return description, poster_url, trailer_url
+
+
+if lxml is not None:
+    parse_list = parse_list_lxml
+    parse_detail = parse_detail_lxml
+else:
+    parse_list = parse_list_soup
+    parse_detail = parse_detail_soup
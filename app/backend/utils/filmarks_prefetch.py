@@ -0,0 +1,130 @@
+# --- utils/filmarks_prefetch.py ---
+# Filmarksのトレンド情報（上映中・公開予定・ジャンル別）をアプリ起動時から定期的に取得し、
+# パース済みの映画レコードをメモリに保持する。speaker_agent はここから読むだけにする。
+# 保持期限（FILMARKS_PREFETCH_MAX_AGE）を過ぎた結果は、古い結果を返しつつ裏で再取得する
+# （stale-while-revalidate）。
+import asyncio
+import logging
+import time
+
+from config import (
+    FILMARKS_PREFETCH_ENABLED,
+    FILMARKS_PREFETCH_INTERVAL,
+    FILMARKS_PREFETCH_MAX_AGE,
+)
+from utils.filmarks import GENRE_MAP, load_filmarks_movies, load_filmarks_genre
+from utils.movie_record import MovieRecord
+from utils import metrics
+
+# speaker_agent が使う件数で取得しておく
+NOW_LIMIT = 10
+GENRE_LIMIT = 5
+
+REFRESH_SECONDS = metrics.histogram(
+    "filmarks_prefetch_refresh_seconds", "Filmarksトレンド情報の再取得にかかった時間"
+)
+REFRESH_FAILURES = metrics.counter(
+    "filmarks_prefetch_refresh_failures_total", "Filmarksトレンド情報の再取得の失敗数"
+)
+
+_store = {}  # {ジョブ名: (結果, 取得時刻)}
+_refreshing = {}  # {ジョブ名: 再取得中のTask}
+_scheduler = None
+
+
+def _jobs() -> dict:
+    jobs = {
+        "now": lambda: load_filmarks_movies(NOW_LIMIT, True),
+        "coming": lambda: load_filmarks_movies(NOW_LIMIT, False),
+    }
+    for genre_name in GENRE_MAP:
+        jobs[f"genre:{genre_name}"] = lambda genre_name=genre_name: load_filmarks_genre(
+            genre_name, GENRE_LIMIT
+        )
+    return jobs
+
+
+async def _refresh(job: str) -> list[MovieRecord | str]:
+    started = time.perf_counter()
+    try:
+        results = await _jobs()[job]()
+    except Exception:
+        REFRESH_FAILURES.inc(job=job)
+        raise
+    finally:
+        REFRESH_SECONDS.observe(time.perf_counter() - started, job=job)
+    _store[job] = (results, time.monotonic())
+    return results
+
+
+def _start_refresh(job: str) -> asyncio.Task:
+    # 同じジョブの再取得は1つにまとめる
+    task = _refreshing.get(job)
+    if task is None:
+        task = asyncio.ensure_future(_refresh(job))
+        _refreshing[job] = task
+        task.add_done_callback(lambda _: _refreshing.pop(job, None))
+    return task
+
+
+async def get_results(job: str) -> list[MovieRecord | str]:
+    entry = _store.get(job)
+    if entry is None:
+        # まだ一度も取得できていない場合だけ、その場で取得を待つ
+        return await asyncio.shield(_start_refresh(job))
+
+    results, refreshed_at = entry
+    if time.monotonic() - refreshed_at > FILMARKS_PREFETCH_MAX_AGE:
+        task = _start_refresh(job)
+        # 再取得の失敗は既に計上済み。古い結果を返し続ける
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    return results
+
+
+# 上映中（now=True）または公開予定（now=False）の映画
+async def get_filmarks_movies(now: bool = True) -> list[MovieRecord | str]:
+    try:
+        return await get_results("now" if now else "coming")
+    except Exception as e:
+        return [f"Filmarksの取得に失敗しました: {str(e)}"]
+
+
+# 指定ジャンルの過去作（ジャンル順に並べる）
+async def get_filmarks_movies_by_genres(genres: list[str]) -> list[MovieRecord | str]:
+    async def by_genre(genre_name: str) -> list[MovieRecord | str]:
+        if genre_name not in GENRE_MAP:
+            return [f"▼ジャンル「{genre_name}」は未対応です。"]
+        try:
+            return await get_results(f"genre:{genre_name}")
+        except Exception as e:
+            return [f"ジャンル「{genre_name}」の取得に失敗しました: {str(e)}"]
+
+    genre_results = await asyncio.gather(*(by_genre(g) for g in genres))
+    return [text for results in genre_results for text in results]
+
+
+async def _run_scheduler() -> None:
+    while True:
+        for job in _jobs():
+            try:
+                await _start_refresh(job)
+            except Exception as e:
+                logging.warning(f"[prefetch] {job} の再取得に失敗: {e}")
+        await asyncio.sleep(FILMARKS_PREFETCH_INTERVAL)
+
+
+def start_prefetch() -> None:
+    global _scheduler
+    if FILMARKS_PREFETCH_ENABLED and _scheduler is None:
+        _scheduler = asyncio.create_task(_run_scheduler())
+
+
+async def stop_prefetch() -> None:
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.cancel()
+        try:
+            await _scheduler
+        except asyncio.CancelledError:
+            pass
+        _scheduler = None
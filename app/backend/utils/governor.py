@@ -0,0 +1,212 @@
+# --- utils/governor.py ---
+# セッションをまたいで、外部サービスへの呼び出し量を全体で抑える（リソースガバナ）。
+# - プロバイダ（OpenAI・Filmarks・TMDb・Tavily）毎の同時実行数と、1秒あたりのリクエスト数の上限
+# - 429・5xx・接続エラーは、ランダムな揺らぎ（jitter）を付けた指数バックオフで再試行
+# - /chat/stream の同時セッション数の上限と、空きを待つ待ち行列（溢れたら busy を返す）
+#   result = await call("tmdb", fetch, url, span=s)
+import asyncio
+import logging
+import random
+import time
+
+import httpx
+
+from config import (
+    BUSY_RETRY_AFTER,
+    FILMARKS_MAX_CONCURRENCY,
+    FILMARKS_MIN_INTERVAL,
+    MAX_ACTIVE_SESSIONS,
+    MAX_QUEUED_SESSIONS,
+    OPENAI_MAX_CONCURRENCY,
+    OPENAI_RATE_PER_SEC,
+    RETRY_ATTEMPTS,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+    SESSION_QUEUE_TIMEOUT,
+    TAVILY_MAX_CONCURRENCY,
+    TAVILY_RATE_PER_SEC,
+    TMDB_MAX_CONCURRENCY,
+    TMDB_RATE_PER_SEC,
+)
+from utils import metrics
+
+# 一時的なエラーとして再試行するHTTPステータス
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+RETRIES = metrics.counter(
+    "governor_retries_total", "一時的なエラーで再試行した呼び出し"
+)
+SESSION_QUEUE_SECONDS = metrics.histogram(
+    "chat_stream_session_queue_seconds", "会話が同時セッション数の空きを待った時間"
+)
+BUSY_SESSIONS = metrics.counter(
+    "chat_stream_busy_total", "混雑のため busy を返した /chat/stream のリクエスト"
+)
+
+
+class TokenBucket:
+    """1秒あたり rate 回（最大 burst 回まで連続）に呼び出しを抑える。rate が0なら無制限。"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        # 待っている呼び出しは到着順に通す
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ProviderLimit:
+    def __init__(self, max_concurrency: int, rate: float, burst: int):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.bucket = TokenBucket(rate, burst)
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        try:
+            await self.bucket.acquire()
+        except BaseException:
+            self.semaphore.release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.semaphore.release()
+
+
+PROVIDERS = {
+    "openai": ProviderLimit(
+        OPENAI_MAX_CONCURRENCY, OPENAI_RATE_PER_SEC, max(1, int(OPENAI_RATE_PER_SEC))
+    ),
+    # filmarks.com はリクエストの開始間隔を空ける（連続では送らない）
+    "filmarks": ProviderLimit(
+        FILMARKS_MAX_CONCURRENCY,
+        1 / FILMARKS_MIN_INTERVAL if FILMARKS_MIN_INTERVAL > 0 else 0,
+        1,
+    ),
+    "tmdb": ProviderLimit(
+        TMDB_MAX_CONCURRENCY, TMDB_RATE_PER_SEC, max(1, int(TMDB_RATE_PER_SEC))
+    ),
+    "tavily": ProviderLimit(
+        TAVILY_MAX_CONCURRENCY, TAVILY_RATE_PER_SEC, max(1, int(TAVILY_RATE_PER_SEC))
+    ),
+}
+
+
+def _status(exc: Exception) -> int | None:
+    # httpx.HTTPStatusError は response に、openai のエラーは status_code に持つ
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, httpx.TransportError):
+        return True
+    if _status(exc) in RETRY_STATUS:
+        return True
+    # openai の接続エラー・タイムアウト（ステータスを持たない）。openai はここではimportしない
+    return type(exc).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def _retry_after(exc: Exception) -> float:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 0))
+    except ValueError:
+        return 0.0
+
+
+def backoff(attempt: int, exc: Exception) -> float:
+    # full jitter: 0〜(基準×2^試行回数) の一様乱数。Retry-After の指定があればそれ以上待つ
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**attempt))
+    return min(RETRY_MAX_DELAY, max(delay, _retry_after(exc)))
+
+
+def raise_for_retryable(response: httpx.Response) -> httpx.Response:
+    """再試行すべきステータスのときだけ例外にする（404などはそのまま呼び出し元で扱う）。"""
+    if response.status_code in RETRY_STATUS:
+        response.raise_for_status()
+    return response
+
+
+async def call(provider: str, fn, *args, span=None, **kwargs):
+    """プロバイダの上限の範囲で fn を呼ぶ。一時的なエラーは待ってから再試行する。
+
+    span（utils.tracing.span）を渡すと、上限の空きを待った時間を記録する。
+    """
+    limit = PROVIDERS[provider]
+    for attempt in range(RETRY_ATTEMPTS + 1):
+        try:
+            async with limit:
+                if span is not None:
+                    span.dequeued()
+                return await fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == RETRY_ATTEMPTS or not is_retryable(e):
+                raise
+            delay = backoff(attempt, e)
+            RETRIES.inc(provider=provider)
+            logging.warning(
+                f"[governor] {provider} を {delay:.2f}s 後に再試行 "
+                f"({attempt + 1}/{RETRY_ATTEMPTS}): {e!r}"
+            )
+            # 待っている間はセマフォを返しているので、他の呼び出しは先に進める
+            await asyncio.sleep(delay)
+
+
+class SessionGate:
+    """同時に進める会話の数の上限。空きが無ければ待ち行列で待ち、それも一杯なら断る。"""
+
+    def __init__(self, max_active: int, max_queued: int, queue_timeout: float):
+        self.semaphore = asyncio.Semaphore(max_active)
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.queued = 0
+
+    async def enter(self) -> bool:
+        if not self.semaphore.locked():
+            await self.semaphore.acquire()
+            return True
+        if self.queued >= self.max_queued:
+            return False
+        self.queued += 1
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.queued -= 1
+            SESSION_QUEUE_SECONDS.observe(time.perf_counter() - started)
+
+    def leave(self) -> None:
+        self.semaphore.release()
+
+
+session_gate = SessionGate(
+    MAX_ACTIVE_SESSIONS, MAX_QUEUED_SESSIONS, SESSION_QUEUE_TIMEOUT
+)
+
+
+def busy_event() -> str:
+    """混雑時に返すSSEイベント。retry_after 秒後につなぎ直すようクライアントに伝える。"""
+    BUSY_SESSIONS.inc()
+    return f'event: busy\ndata: {{"retry_after": {BUSY_RETRY_AFTER}}}\n\n'
@@ -0,0 +1,22 @@
+# --- utils/http_client.py ---
+# Filmarks・TMDb・Tavily で共有する非同期HTTPクライアント。
+# リクエスト毎に接続を張り直さないよう、プロセスで1つだけ生成して使い回す。
+import httpx
+
+HTTP_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+
+_client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(timeout=HTTP_TIMEOUT, follow_redirects=True)
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
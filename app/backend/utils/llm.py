@@ -0,0 +1,120 @@
+# --- utils/llm.py ---
+# エージェントからのLLM呼び出しの窓口。役割（utils/model_registry.py）でモデルを選び、
+# キャッシュが有効なテンプレートは utils/llm_cache のキャッシュを通す。
+# 呼び出し毎に所要時間と、入力トークンのうちOpenAIのプロンプトキャッシュから読まれた分を記録する。
+import asyncio
+import logging
+from langchain_core.runnables import RunnableConfig
+from langgraph.constants import TAG_NOSTREAM
+from utils.model_registry import get_role_model
+from utils import governor, llm_cache
+from utils.metrics import counter
+from utils.tokens import estimate_tokens
+from utils.tracing import span
+from utils.ttl_cache import MISSING
+
+# キャッシュから返した応答の使用量（予算の計算ではコスト0として扱う）
+NO_USAGE = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+
+# クライアントの切断で途中で止めた呼び出し（無駄にならずに済んだ処理）の数
+CANCELLED_CALLS = counter(
+    "chat_stream_cancelled_calls_total", "切断により取り消したLLM呼び出し・ツール取得"
+)
+
+INPUT_TOKENS = counter(
+    "llm_input_tokens_total",
+    "LLMの入力トークン数（cached=true はプロンプトキャッシュから読まれた分）",
+)
+OUTPUT_TOKENS = counter("llm_output_tokens_total", "LLMの出力トークン数")
+
+
+def _record(role: str, message, elapsed: float) -> None:
+    usage = message.usage_metadata
+    if usage is None:
+        return
+    cached = (usage.get("input_token_details") or {}).get("cache_read") or 0
+    INPUT_TOKENS.inc(cached, role=role, cached="true")
+    INPUT_TOKENS.inc(usage["input_tokens"] - cached, role=role, cached="false")
+    OUTPUT_TOKENS.inc(usage["output_tokens"], role=role)
+    logging.info(
+        f"[llm] role={role} input={usage['input_tokens']} cached={cached} "
+        f"output={usage['output_tokens']} {elapsed:.3f}s"
+    )
+
+
+async def _ainvoke(role: str, runnable, prompt_value, config: RunnableConfig):
+    try:
+        async with span("llm", name=role) as s:
+            result = await governor.call(
+                "openai", runnable.ainvoke, prompt_value, config, span=s
+            )
+    except asyncio.CancelledError:
+        CANCELLED_CALLS.inc(kind="llm", name=role)
+        raise
+    # 構造化出力（include_raw=True）の場合は元の応答メッセージの使用量を見る
+    _record(
+        role,
+        result["raw"] if isinstance(result, dict) else result,
+        s.seconds,
+    )
+    return result
+
+
+async def invoke_llm(
+    role: str,
+    template: str,
+    prompt_value,
+    config: RunnableConfig,
+    model_name: str | None = None,
+):
+    model = get_role_model(role, model_name)
+    if not llm_cache.is_enabled(template):
+        return await _ainvoke(role, model, prompt_value, config)
+
+    entry = llm_cache.lookup(template, model, prompt_value)
+    if entry.response is not MISSING:
+        return entry.response.model_copy(update={"usage_metadata": NO_USAGE})
+    response = await _ainvoke(role, model, prompt_value, config)
+    entry.store(response)
+    return response
+
+
+async def invoke_structured(
+    role: str,
+    prompt_value,
+    config: RunnableConfig,
+    schema: dict,
+    model_name: str | None = None,
+):
+    """JSON Schemaに沿った出力を求める。(解析結果 | None, 応答のメッセージ, 構造化出力を使ったか) を返す。
+
+    モデルが構造化出力に対応していない場合（ローカルの代替モデルなど）は通常の呼び出しを行い、
+    解析結果は None、3番目は False になる。構造化出力を使ったのに解析できなかった場合
+    （max_tokens で途中で切れたJSONなど）は、解析結果が None で3番目は True になる。
+    出力はJSONなので、トークン単位のストリーミングの対象から外す。
+    """
+    model = get_role_model(role, model_name)
+    try:
+        structured = model.with_structured_output(
+            schema, method="json_schema", strict=True, include_raw=True
+        )
+    except NotImplementedError:
+        response = await _ainvoke(
+            role, model.with_config(tags=[TAG_NOSTREAM]), prompt_value, config
+        )
+        return None, response, False
+    result = await _ainvoke(
+        role, structured.with_config(tags=[TAG_NOSTREAM]), prompt_value, config
+    )
+    if result["parsed"] is None:
+        logging.warning(
+            f"[llm] role={role} 構造化出力を解析できません: {result.get('parsing_error')!r}"
+        )
+    return result["parsed"], result["raw"], True
+
+
+def usage_tokens(prompt_value, response) -> int:
+    """1回の呼び出しで使ったトークン数。APIが使用量を返さない場合は見積もる。"""
+    if response.usage_metadata is not None:
+        return response.usage_metadata["total_tokens"]
+    return estimate_tokens(prompt_value.to_string()) + estimate_tokens(response.content)
@@ -0,0 +1,107 @@
+# --- utils/llm_cache.py ---
+# LLM応答のキャッシュ（テンプレート単位でオプトイン）。
+# - 完全一致: レンダリング済みメッセージ + モデル設定のハッシュをキーにする
+# - 類似一致（任意）: 同じテンプレート・モデル設定の中で、文字2-gramのベクトルの
+#   コサイン類似度が LLM_CACHE_SEMANTIC_THRESHOLD 以上の応答を再利用する
+import hashlib
+import json
+import math
+from collections import Counter as NgramCounter
+from config import (
+    LLM_CACHE_TEMPLATES,
+    LLM_CACHE_TTL,
+    LLM_CACHE_MAXSIZE,
+    LLM_CACHE_SEMANTIC_THRESHOLD,
+)
+from utils.metrics import counter
+from utils.ttl_cache import TTLCache, MISSING
+
+LOOKUPS = counter(
+    "llm_cache_lookups_total", "LLMキャッシュの参照回数（result=exact|semantic|miss）"
+)
+EVICTIONS = counter("llm_cache_evictions_total", "件数上限で追い出したLLM応答の数")
+
+_exact = TTLCache(
+    LLM_CACHE_MAXSIZE, LLM_CACHE_TTL, on_evict=lambda: EVICTIONS.inc(tier="exact")
+)
+# {完全一致キー: (テンプレート, モデル設定キー, ベクトル, 応答)}
+_semantic = TTLCache(
+    LLM_CACHE_MAXSIZE, LLM_CACHE_TTL, on_evict=lambda: EVICTIONS.inc(tier="semantic")
+)
+
+
+def is_enabled(template: str) -> bool:
+    # "maplejava/summarizer-template" と "summarizer-template" のどちらの指定でも有効にする
+    return template in LLM_CACHE_TEMPLATES or (
+        template.split("/")[-1] in LLM_CACHE_TEMPLATES
+    )
+
+
+def _model_key(model) -> str:
+    # モデル名・temperature などの設定が違えば別の応答として扱う
+    return json.dumps(model.dict(), sort_keys=True, default=str)
+
+
+def _prompt_text(prompt_value) -> str:
+    return "\n".join(
+        f"{message.type}: {message.content}" for message in prompt_value.to_messages()
+    )
+
+
+def _embed(text: str) -> dict:
+    # 外部サービスを使わない簡易な埋め込み（文字2-gramの出現数を正規化したもの）
+    grams = NgramCounter(text[i : i + 2] for i in range(len(text) - 1))
+    norm = math.sqrt(sum(count * count for count in grams.values())) or 1.0
+    return {gram: count / norm for gram, count in grams.items()}
+
+
+def _similarity(a: dict, b: dict) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(gram, 0.0) for gram, weight in a.items())
+
+
+class CacheEntry:
+    """lookup() の結果。応答が無ければ store() で保存する。"""
+
+    def __init__(self, template: str, model, prompt_value):
+        self.template = template
+        self.model_key = _model_key(model)
+        self.text = _prompt_text(prompt_value)
+        self.key = hashlib.sha256(
+            f"{self.model_key}\n{self.text}".encode("utf-8")
+        ).hexdigest()
+        self.response = MISSING
+
+    def store(self, response) -> None:
+        _exact.set(self.key, response)
+        if LLM_CACHE_SEMANTIC_THRESHOLD > 0:
+            _semantic.set(
+                self.key,
+                (self.template, self.model_key, _embed(self.text), response),
+            )
+
+
+def lookup(template: str, model, prompt_value) -> CacheEntry:
+    entry = CacheEntry(template, model, prompt_value)
+    entry.response = _exact.get(entry.key)
+    if entry.response is not MISSING:
+        LOOKUPS.inc(template=template, result="exact")
+        return entry
+
+    if LLM_CACHE_SEMANTIC_THRESHOLD > 0:
+        vector = _embed(entry.text)
+        best_score, best_response = 0.0, MISSING
+        for _, (template_, model_key, cached_vector, response) in _semantic.items():
+            if template_ != template or model_key != entry.model_key:
+                continue
+            score = _similarity(vector, cached_vector)
+            if score > best_score:
+                best_score, best_response = score, response
+        if best_score >= LLM_CACHE_SEMANTIC_THRESHOLD:
+            entry.response = best_response
+            LOOKUPS.inc(template=template, result="semantic")
+            return entry
+
+    LOOKUPS.inc(template=template, result="miss")
+    return entry
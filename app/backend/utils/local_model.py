@@ -0,0 +1,149 @@
+# --- utils/local_model.py ---
+# OpenAIを呼ばずにグラフ全体を動かすためのローカルの代替モデル（オフラインのベンチマーク用）。
+# 役割ごとに決まった形の応答を、指定した遅延と速度でトークン単位に返す。
+# 司会の話者選びでは、プロンプト中に出てくるキャラクター名から次の話者を選ぶ。
+# OpenAIのプロンプトキャッシュも真似て、使用量の cache_read に載せる
+# （最近の入力と一致する先頭が1024トークン以上なら、128トークン単位で切り捨てた分）。
+import asyncio
+import json
+import os
+import time
+import zlib
+from functools import lru_cache
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from config import (
+    LOCAL_MODEL_LATENCY,
+    LOCAL_MODEL_REPLIES,
+    LOCAL_MODEL_TOKENS_PER_SEC,
+)
+from utils.character_store import get_profiles
+from utils.tokens import estimate_tokens
+
+CHUNK_CHARS = 4  # ストリーミング時に1度に返す文字数
+CACHE_MIN_TOKENS = 1024  # OpenAIのプロンプトキャッシュが効く入力の最小トークン数
+CACHE_BLOCK_TOKENS = 128  # キャッシュされる長さの単位
+CACHE_RECENT_PROMPTS = 256  # 先頭の一致を調べる最近の入力の数
+
+_recent_prompts = []  # 最近の入力（メッセージを連結したテキスト）
+
+REPLIES = {
+    "moderator-first": "みなさん、こんにちは！今日は最近おすすめの映画について、"
+    "好きなジャンルや最近観た作品の話をしながら語り合いましょう。",
+    "moderator-summary": "今日は上映中の話題作から過去の名作まで、たくさんの映画の話ができました。"
+    "気になった作品をぜひ観てみてください。ありがとうございました！",
+    "speaker": "私のおすすめは、最近話題になっているあの作品です。"
+    "映像がとにかく綺麗で、登場人物の気持ちが丁寧に描かれているところが好きです。"
+    "ジャンルが好きな人なら、きっと楽しめると思います。",
+}
+
+
+@lru_cache(maxsize=None)
+def _replies() -> dict[str, tuple[str, ...]]:
+    replies = {role: (text,) for role, text in REPLIES.items()}
+    if LOCAL_MODEL_REPLIES:
+        with open(LOCAL_MODEL_REPLIES, "r", encoding="utf-8") as f:
+            replies.update({role: tuple(texts) for role, texts in json.load(f).items()})
+    return replies
+
+
+def _next_speaker(prompt_text: str) -> str:
+    # プロンプトに出てくる順のキャラクター名（最初の1人は司会自身とみなして除く）
+    names = sorted(
+        (name for name in get_profiles().personas if name in prompt_text),
+        key=prompt_text.index,
+    )
+    candidates = names[1:] or names or ["未定"]
+    name = candidates[zlib.crc32(prompt_text.encode("utf-8")) % len(candidates)]
+    return (
+        f"次の話者：{name}\nコメント：では{name}さん、おすすめの映画を教えてください！"
+    )
+
+
+def _cached_tokens(messages) -> int:
+    prompt = "".join(f"{message.type}:{message.content}\n" for message in messages)
+    matched = max(
+        (len(os.path.commonprefix([prompt, seen])) for seen in _recent_prompts),
+        default=0,
+    )
+    _recent_prompts.append(prompt)
+    del _recent_prompts[:-CACHE_RECENT_PROMPTS]
+    tokens = estimate_tokens(prompt[:matched])
+    if tokens < CACHE_MIN_TOKENS:
+        return 0
+    return tokens // CACHE_BLOCK_TOKENS * CACHE_BLOCK_TOKENS
+
+
+class LocalChatModel(BaseChatModel):
+    role: str = "speaker"
+    max_tokens: int | None = None
+    latency: float = LOCAL_MODEL_LATENCY  # 最初のトークンまでの秒数
+    tokens_per_second: float = LOCAL_MODEL_TOKENS_PER_SEC
+
+    @property
+    def _llm_type(self) -> str:
+        return "local-stand-in"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"role": self.role, "max_tokens": self.max_tokens}
+
+    def _reply(self, messages) -> str:
+        prompt_text = "\n".join(str(message.content) for message in messages)
+        if self.role == "moderator-next":
+            text = _next_speaker(prompt_text)
+        elif self.role == "summarizer":
+            # 最後のメッセージ（要約対象の発言）の冒頭をそのまま要約とする
+            text = str(messages[-1].content)[:60]
+        else:
+            # 応答が複数ある場合は、プロンプトから決まった1つを返す（同じ入力なら同じ応答）
+            choices = _replies().get(self.role) or _replies()["speaker"]
+            text = choices[zlib.crc32(prompt_text.encode("utf-8")) % len(choices)]
+        if self.max_tokens is not None:
+            text = text[: self.max_tokens]
+        return text
+
+    def _usage(self, messages, text: str) -> dict:
+        input_tokens = sum(
+            estimate_tokens(str(message.content)) for message in messages
+        )
+        output_tokens = estimate_tokens(text)
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+            "input_token_details": {"cache_read": _cached_tokens(messages)},
+        }
+
+    def _duration(self, text: str) -> float:
+        return self.latency + len(text) / self.tokens_per_second
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = self._reply(messages)
+        time.sleep(self._duration(text))
+        message = AIMessage(content=text, usage_metadata=self._usage(messages, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = self._reply(messages)
+        await asyncio.sleep(self._duration(text))
+        message = AIMessage(content=text, usage_metadata=self._usage(messages, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        text = self._reply(messages)
+        await asyncio.sleep(self.latency)
+        for start in range(0, len(text), CHUNK_CHARS):
+            piece = text[start : start + CHUNK_CHARS]
+            await asyncio.sleep(len(piece) / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+        # 使用量は最後のチャンクで返す（OpenAIのstream_usageと同じ形）
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(
+                content="", usage_metadata=self._usage(messages, text)
+            )
+        )
@@ -0,0 +1,95 @@
+# --- utils/metrics.py ---
+# プロセス内で集計する簡易メトリクス（カウンタとヒストグラム）。
+# ラベルはキーワード引数で渡す: REFRESH_FAILURES.inc(job="now")
+# render() でPrometheusのテキスト形式にする（/metrics で公開）。
+import threading
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = {}  # {メトリクス名: Counter | Histogram}
+_lock = threading.Lock()
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self.values = {}  # {ラベル: 値}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(_label_key(labels), 0.0)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.values = {}  # {ラベル: {"counts": [...], "sum": 合計, "count": 件数}}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with _lock:
+            entry = self.values.setdefault(
+                key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            )
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["counts"][i] += 1
+            entry["sum"] += value
+            entry["count"] += 1
+
+
+def counter(name: str, help_text: str) -> Counter:
+    with _lock:
+        return _registry.setdefault(name, Counter(name, help_text))
+
+
+def histogram(name: str, help_text: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+    with _lock:
+        return _registry.setdefault(name, Histogram(name, help_text, buckets))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels_text(key: tuple, extra: tuple = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def render() -> str:
+    """登録済みの全メトリクスをPrometheusのテキスト形式で返す。"""
+    lines = []
+    with _lock:
+        metrics = sorted(_registry.values(), key=lambda m: m.name)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            if isinstance(metric, Counter):
+                lines.append(f"# TYPE {metric.name} counter")
+                for key, value in sorted(metric.values.items()):
+                    lines.append(f"{metric.name}{_labels_text(key)} {value}")
+                continue
+            lines.append(f"# TYPE {metric.name} histogram")
+            for key, entry in sorted(metric.values.items()):
+                # counts は各上限以下の件数（累積）
+                for bound, count in zip(metric.buckets, entry["counts"]):
+                    le = _labels_text(key, (("le", bound),))
+                    lines.append(f"{metric.name}_bucket{le} {count}")
+                le = _labels_text(key, (("le", "+Inf"),))
+                lines.append(f"{metric.name}_bucket{le} {entry['count']}")
+                lines.append(f"{metric.name}_sum{_labels_text(key)} {entry['sum']}")
+                lines.append(f"{metric.name}_count{_labels_text(key)} {entry['count']}")
+    return "\n".join(lines) + "\n"
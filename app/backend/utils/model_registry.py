@@ -0,0 +1,65 @@
+# --- utils/model_registry.py ---
+# 役割（司会の冒頭・話者選び・締め、speaker、要約）ごとのモデル設定。
+# 要約と話者選びは短く形の決まった出力なので、小さいモデルと短い max_tokens を使う。
+# モデル名は環境変数で上書きできる（MODEL_SUMMARIZER=gpt-4o-mini など）。
+# "local" を指定するとローカルの代替モデル（utils/local_model.py）を使う。
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from config import DEFAULT_MODEL, SMALL_MODEL, LLM_BACKEND, ROLE_MODEL_OVERRIDES
+
+
+@dataclass(frozen=True, slots=True)
+class ModelSpec:
+    model: str
+    temperature: float | None = None  # None ならモデルの既定値
+    max_tokens: int | None = None
+    timeout: float | None = None  # 1回の呼び出しのタイムアウト（秒）
+
+
+ROLE_MODELS = {
+    "moderator-first": ModelSpec(DEFAULT_MODEL, timeout=60),
+    "moderator-next": ModelSpec(
+        SMALL_MODEL, temperature=0.2, max_tokens=150, timeout=20
+    ),
+    "moderator-summary": ModelSpec(DEFAULT_MODEL, timeout=60),
+    "speaker": ModelSpec(DEFAULT_MODEL, timeout=60),
+    "summarizer": ModelSpec(SMALL_MODEL, temperature=0.2, max_tokens=200, timeout=20),
+}
+
+
+def resolve_spec(role: str, model_name: str | None = None) -> ModelSpec:
+    """役割のモデル設定。ターンプランのモデル指定（model_name）より環境変数の指定を優先する。"""
+    spec = ROLE_MODELS[role]
+    model = (
+        ("local" if LLM_BACKEND == "local" else None)
+        or ROLE_MODEL_OVERRIDES.get(role)
+        or model_name
+        or spec.model
+    )
+    return replace(spec, model=model)
+
+
+def get_role_model(role: str, model_name: str | None = None):
+    return _build(role, resolve_spec(role, model_name))
+
+
+# LLMクライアントは初回利用時に生成する（import時の副作用を無くし起動を速くする）
+@lru_cache(maxsize=None)
+def _build(role: str, spec: ModelSpec):
+    if spec.model == "local":
+        from utils.local_model import LocalChatModel
+
+        return LocalChatModel(role=role, max_tokens=spec.max_tokens)
+
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        model=spec.model,
+        temperature=spec.temperature,
+        max_tokens=spec.max_tokens,
+        timeout=spec.timeout,
+        # ストリーミング時も最後のチャンクで使用量を受け取る（トークン数の記録・予算の計算に使う）
+        stream_usage=True,
+        # 再試行は utils/governor.py がまとめて行う（クライアント側で重ねて再試行しない）
+        max_retries=0,
+    )
@@ -0,0 +1,98 @@
+# --- utils/movie_record.py ---
+# Filmarks・TMDbから取得した映画情報のレコード型と、プロンプト用のテキストへの変換。
+# ツールはレコードのまま返し、プロンプトを組み立てる時に1度だけテキストにする。
+from dataclasses import dataclass
+
+from utils.tokens import estimate_tokens
+
+
+@dataclass(frozen=True, slots=True)
+class MovieRecord:
+    source: str  # "filmarks" | "tmdb"（表示形式の切り替えに使う）
+    group: str  # 見出し（例:「■ジャンル: SF」）。同じ見出しのレコードはまとめて表示する
+    title: str
+    genres: tuple[str, ...]
+    release_date: str
+    synopsis: str
+    score: str = ""
+    poster_url: str = ""
+    trailer_url: str = ""
+
+    def render(self, number: int) -> str:
+        if self.source == "tmdb":
+            return (
+                f"- {self.title}（{self.release_date}）\n"
+                f"  ジャンル: {', '.join(self.genres)}\n"
+                f"  {self.synopsis}"
+            )
+        return (
+            f"【映画{number}】\n"
+            f"タイトル: {self.title}\n"
+            f"ジャンル: {', '.join(self.genres) if self.genres else 'ジャンル記載なし'}\n"
+            f"公開日: {self.release_date}\n"
+            f"評価スコア: {self.score}\n"
+            f"あらすじ: {self.synopsis}\n"
+            f"ポスター: {self.poster_url}\n"
+            f"予告編: {self.trailer_url}"
+        )
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    # 見積もりトークン数が max_tokens に収まるまで末尾を削る
+    text = text[:max_tokens]
+    while text and estimate_tokens(text + "…") > max_tokens:
+        text = text[:-1]
+    return text + "…" if text else ""
+
+
+# ツールの結果（MovieRecord または 検索結果・エラーメッセージなどの文字列）を
+# プロンプト用のテキストにする。
+# - 同じタイトルの映画は最初の1件だけ残す
+# - 見出し（group）毎にまとめ、見積もりトークン数が max_tokens に収まるよう、
+#   各見出しの先頭から1件ずつ順番に採る（後ろの見出しが丸ごと落ちないように）
+# - 最初の1件だけで上限を超える場合は、その1件を上限まで切り詰める
+def render_tool_results(results: list, max_tokens: int) -> str:
+    groups = []  # [(見出し, [項目, ...])]。文字列の結果は1件で1まとまり
+    by_group = {}
+    seen_titles = set()
+    for item in results:
+        if not isinstance(item, MovieRecord):
+            groups.append((None, [item]))
+            continue
+        if item.title in seen_titles:
+            continue
+        seen_titles.add(item.title)
+        if item.group not in by_group:
+            by_group[item.group] = []
+            groups.append((item.group or None, by_group[item.group]))
+        by_group[item.group].append(item)
+
+    def render(header, items, index):
+        item = items[index]
+        text = item.render(index + 1) if isinstance(item, MovieRecord) else item
+        return f"{header}\n{text}" if header and index == 0 else text
+
+    taken = [[] for _ in groups]  # 見出し毎に採ったテキスト（先頭から順）
+    open_groups = set(range(len(groups)))
+    used = 0
+    rank = 0
+    while open_groups:
+        for i in sorted(open_groups):
+            header, items = groups[i]
+            if rank >= len(items):
+                open_groups.discard(i)
+                continue
+            text = render(header, items, rank)
+            cost = estimate_tokens(text)
+            if used + cost > max_tokens:
+                # この見出しは打ち切る（番号が飛ばないよう、後ろの項目も採らない）
+                open_groups.discard(i)
+                continue
+            taken[i].append(text)
+            used += cost
+        rank += 1
+
+    if groups and not any(taken):
+        header, items = groups[0]
+        return _truncate(render(header, items, 0), max_tokens)
+    return "\n".join(text for texts in taken for text in texts)
@@ -0,0 +1,84 @@
+# --- utils/page_cache.py ---
+# 取得したHTMLをSQLiteに保存するキャッシュ。再起動後も有効期限内なら再利用する。
+# 同じURLへの同時取得は1回にまとめる（single-flight）。
+# max_age を過ぎた行は、開いたときと、その後は PRUNE_INTERVAL 毎の書き込み時に消す。
+import asyncio
+import sqlite3
+import threading
+import time
+
+from utils.tracing import CACHE_LOOKUPS
+
+PRUNE_INTERVAL = 60 * 60
+
+
+class PageCache:
+    def __init__(self, path, max_age: float):
+        self.max_age = max_age
+        self.pruned_at = 0.0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "url TEXT PRIMARY KEY, body TEXT NOT NULL, fetched_at REAL NOT NULL)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS pages_fetched_at ON pages (fetched_at)"
+            )
+            self.conn.commit()
+        self.prune()
+        self.inflight = {}  # {URL: 取得中のTask}
+
+    def prune(self) -> int:
+        """有効期限（max_age）を過ぎた行を消し、消した行数を返す。"""
+        with self.lock:
+            cursor = self.conn.execute(
+                "DELETE FROM pages WHERE fetched_at < ?", (time.time() - self.max_age,)
+            )
+            self.conn.commit()
+            self.pruned_at = time.monotonic()
+        return cursor.rowcount
+
+    def get(self, url: str, ttl: float):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT body, fetched_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None or time.time() - row[1] > ttl:
+            return None
+        return row[0]
+
+    def set(self, url: str, body: str) -> None:
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (url, body, fetched_at) VALUES (?, ?, ?)",
+                (url, body, time.time()),
+            )
+            self.conn.commit()
+        if time.monotonic() - self.pruned_at > PRUNE_INTERVAL:
+            self.prune()
+
+    async def fetch(self, url: str, ttl: float, loader) -> str:
+        # loader は「(本文, キャッシュしてよいか)」を返すコルーチン関数
+        body = await asyncio.to_thread(self.get, url, ttl)
+        if body is not None:
+            CACHE_LOOKUPS.inc(cache="page", result="hit")
+            return body
+
+        task = self.inflight.get(url)
+        # 同じURLを取得中なら、その結果を待つ（shared）
+        CACHE_LOOKUPS.inc(cache="page", result="miss" if task is None else "shared")
+        if task is None:
+            task = asyncio.ensure_future(self._load(url, loader))
+            self.inflight[url] = task
+            task.add_done_callback(lambda _: self.inflight.pop(url, None))
+        # 待っている1リクエストがキャンセルされても、他の待ち手の取得は続ける
+        return await asyncio.shield(task)
+
+    async def _load(self, url: str, loader) -> str:
+        body, cacheable = await loader(url)
+        if cacheable:
+            await asyncio.to_thread(self.set, url, body)
+        return body
@@ -0,0 +1,76 @@
+# --- utils/prompt_layout.py ---
+# OpenAIのプロンプトキャッシュ（前回と先頭が一致する入力の再利用）が効くよう、テンプレートの並びを組み替える。
+# LangSmithのテンプレートは人物設定・テーマと、ターン毎に変わる入力（直前の発言・要約・ツール結果）が
+# 交互に並んでいるため、最初のターン毎の入力より後ろは毎回キャッシュが外れる。
+# systemメッセージを段落（空行区切り）に分け、セッション中変わらない段落を先頭に、
+# ターン毎の段落を後ろに集める。入力を含まない段落（指示文など）は元の位置関係を保つ。
+from string import Formatter
+
+from langchain_core.prompts import (
+    ChatPromptTemplate,
+    PromptTemplate,
+    SystemMessagePromptTemplate,
+)
+
+from utils.character_store import PROFILE_FIELDS
+
+# セッション中に変わらない入力（キャラ毎の人物設定と、ユーザがフォームで入力した内容）
+SESSION_VARIABLES = {
+    "name",
+    *PROFILE_FIELDS,
+    "thema",
+    "genres",
+    "seen_movies",
+    "user_message",
+    "character_names",
+}
+
+
+def _variables(paragraph: str) -> set[str]:
+    return {field for _, field, _, _ in Formatter().parse(paragraph) if field}
+
+
+def _split(template: str) -> tuple[str, str]:
+    """(セッション中変わらない前半, ターン毎の後半) に分ける。"""
+    prefix, suffix = [], []
+    for paragraph in template.split("\n\n"):
+        variables = _variables(paragraph)
+        if variables - SESSION_VARIABLES or (suffix and not variables):
+            # ターン毎の入力を含む段落と、それより後ろの指示文などは元の並びのまま後半に
+            suffix.append(paragraph)
+        else:
+            prefix.append(paragraph)
+    return "\n\n".join(prefix), "\n\n".join(suffix)
+
+
+def _layout(messages) -> list:
+    return [(type(m).__name__, getattr(m, "prompt", m)) for m in messages]
+
+
+def cache_friendly(prompt):
+    """プロンプトキャッシュが効く並びにしたテンプレート。組み替えられない場合はそのまま返す。"""
+    if not isinstance(prompt, ChatPromptTemplate):
+        return prompt
+    prefix, rest = [], []
+    for message in prompt.messages:
+        inner = getattr(message, "prompt", None)
+        if not (
+            isinstance(message, SystemMessagePromptTemplate)
+            and isinstance(inner, PromptTemplate)
+            and inner.template_format == "f-string"
+        ):
+            rest.append(message)
+            continue
+        try:
+            head, tail = _split(inner.template)
+        except ValueError:
+            # 波括弧が段落をまたぐなど、段落単位で解析できないテンプレート
+            return prompt
+        if head:
+            prefix.append(SystemMessagePromptTemplate.from_template(head))
+        if tail:
+            rest.append(SystemMessagePromptTemplate.from_template(tail))
+    messages = prefix + rest
+    if _layout(messages) == _layout(prompt.messages):
+        return prompt
+    return prompt.model_copy(update={"messages": messages})
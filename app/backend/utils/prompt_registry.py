@@ -0,0 +1,148 @@
+# --- utils/prompt_registry.py ---
+# LangSmithのプロンプトをプロセス内にキャッシュして、ターン毎のpull_promptを無くす。
+# - 起動時に warm_prompts() で全テンプレートを取得
+# - PROMPT_TTL_SECONDS を過ぎたものはキャッシュを返しつつバックグラウンドで再取得
+# - LangSmithが遅い・落ちている場合はディスク上のスナップショットにフォールバック
+# - プロンプトキャッシュが効く並びに組み替えたもの（utils/prompt_layout.py）を返す
+import asyncio
+import json
+import logging
+import sys
+import threading
+import time
+
+from langchain_core.load import dumpd, load
+
+from config import (
+    get_client,
+    PROMPT_PREFIX_LAYOUT,
+    PROMPT_TTL_SECONDS,
+    PROMPT_SNAPSHOT_DIR,
+)
+from utils.prompt_layout import cache_friendly
+from utils.tracing import CACHE_LOOKUPS, span
+
+PROMPT_NAMES = [
+    "maplejava/moderator-first-template",
+    "maplejava/moderator-next-speaker-template",
+    "maplejava/moderator-summary-template",
+    "maplejava/speaker-template",
+    "maplejava/speaker-trend",
+    "maplejava/speaker-trend-coming",
+    "maplejava/speaker-trend-genres",
+    "maplejava/speaker-user-history",
+    "maplejava/summarizer-template",
+]
+
+_cache = {}  # {プロンプト名: (プロンプト, 取得時刻)}
+_refreshing = set()  # バックグラウンド再取得中のプロンプト名
+_lock = threading.Lock()
+
+
+def _snapshot_path(name: str):
+    return PROMPT_SNAPSHOT_DIR / (name.replace("/", "__") + ".json")
+
+
+def _write_snapshot(name: str, prompt) -> None:
+    PROMPT_SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+    with open(_snapshot_path(name), "w", encoding="utf-8") as f:
+        json.dump(dumpd(prompt), f, ensure_ascii=False, indent=2)
+
+
+def _read_snapshot(name: str):
+    path = _snapshot_path(name)
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return load(json.load(f))
+
+
+def _prepare(prompt):
+    # スナップショットはLangSmithの内容のまま保存し、組み替えはメモリ上のものだけに行う
+    return cache_friendly(prompt) if PROMPT_PREFIX_LAYOUT else prompt
+
+
+def _fetch(name: str, pin: bool = False):
+    # LangSmithから取得し、スナップショットが無ければ（またはpin指定時は）保存する
+    with span("langsmith", name=name):
+        prompt = get_client().pull_prompt(name)
+    if pin or not _snapshot_path(name).exists():
+        _write_snapshot(name, prompt)
+    prompt = _prepare(prompt)
+    with _lock:
+        _cache[name] = (prompt, time.monotonic())
+    return prompt
+
+
+def _load(name: str):
+    try:
+        return _fetch(name)
+    except Exception as e:
+        prompt = _read_snapshot(name)
+        if prompt is None:
+            raise
+        prompt = _prepare(prompt)
+        logging.warning(
+            f"[prompt] {name} の取得に失敗したためスナップショットを使用: {e}"
+        )
+        with _lock:
+            # スナップショットも期限付きで保持し、次回アクセス時に再取得を試みる
+            _cache[name] = (prompt, time.monotonic())
+        return prompt
+
+
+def _refresh(name: str) -> None:
+    try:
+        _fetch(name)
+    except Exception as e:
+        # 失敗しても手元のキャッシュを使い続ける
+        logging.warning(f"[prompt] {name} のバックグラウンド更新に失敗: {e}")
+    finally:
+        with _lock:
+            _refreshing.discard(name)
+
+
+def _lookup(name: str):
+    """キャッシュにあればそのプロンプト、無ければ None（期限切れなら裏で再取得を始める）。"""
+    with _lock:
+        entry = _cache.get(name)
+        if entry is None:
+            stale = False
+        else:
+            prompt, fetched_at = entry
+            stale = time.monotonic() - fetched_at > PROMPT_TTL_SECONDS
+            if stale and name not in _refreshing:
+                _refreshing.add(name)
+                threading.Thread(target=_refresh, args=(name,), daemon=True).start()
+
+    CACHE_LOOKUPS.inc(
+        cache="prompt", result="miss" if entry is None else "stale" if stale else "hit"
+    )
+    return None if entry is None else prompt
+
+
+async def get_prompt(name: str):
+    prompt = _lookup(name)
+    if prompt is None:
+        # 未取得のものだけその場で取得する（通常は起動時のwarm_promptsで取得済み）。
+        # LangSmithへの同期的な取得はスレッドで行い、他のセッションの処理を止めない
+        return await asyncio.to_thread(_load, name)
+    return prompt
+
+
+# 起動時に全テンプレートを取得しておく。失敗したものは初回アクセス時に再試行される。
+def warm_prompts() -> None:
+    for name in PROMPT_NAMES:
+        try:
+            _load(name)
+        except Exception as e:
+            logging.error(f"[prompt] {name} のウォームアップに失敗: {e}")
+
+
+# スナップショットを最新のLangSmithの内容で固定し直す
+# 使い方: python -m utils.prompt_registry --pin
+if __name__ == "__main__":
+    if "--pin" in sys.argv:
+        for name in PROMPT_NAMES:
+            _fetch(name, pin=True)
+            print(f"pinned: {name} -> {_snapshot_path(name)}")
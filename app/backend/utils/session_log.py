@@ -0,0 +1,71 @@
+# --- utils/session_log.py ---
+# /chat/stream のセッション毎の送信済みイベントの記録。
+# 再接続（Last-Event-ID）時は、送信済みのイベントをLLMを呼ばずにそのまま再送する。
+# グラフの途中経過は LangGraph のチェックポイント（thread_id = セッションID）に残るので、
+# 再送の後はそこから続きを実行する。
+import asyncio
+import logging
+import time
+from config import SESSION_TTL
+
+
+class SessionLog:
+    def __init__(self, run_config: dict, first_id: int = 1):
+        self.run_config = run_config  # 再接続時も最初の接続と同じ設定で続きを実行する
+        self.events = []  # [(イベントID, SSEのテキスト)]
+        self.keys = set()  # 記録済みのイベントのキー（同じ発言を2回送らないため）
+        self.next_id = first_id
+        self.done = False  # 終了イベントまで送信済みか
+        self.lock = asyncio.Lock()  # 同じセッションのグラフを同時に2つ動かさない
+        self.touched_at = time.monotonic()
+
+    def add(self, data: str, event: str | None = None, key: str | None = None) -> str:
+        """イベントIDを振って記録し、送信するSSEのテキストを返す。
+
+        key が記録済みなら（再接続後に同じノードの結果を受け取った場合など）何もせず "" を返す。
+        """
+        if key is not None:
+            if key in self.keys:
+                return ""
+            self.keys.add(key)
+        event_id = self.next_id
+        self.next_id += 1
+        text = f"id: {event_id}\n"
+        if event:
+            text += f"event: {event}\n"
+        text += f"data: {data}\n\n"
+        self.events.append((event_id, text))
+        self.touched_at = time.monotonic()
+        return text
+
+    def since(self, last_event_id: int) -> list[str]:
+        self.touched_at = time.monotonic()
+        return [text for event_id, text in self.events if event_id > last_event_id]
+
+
+_sessions = {}  # {セッションID: SessionLog}
+
+
+def get_session(session_id: str) -> SessionLog | None:
+    return _sessions.get(session_id)
+
+
+def create_session(session_id: str, run_config: dict, first_id: int = 1) -> SessionLog:
+    session = _sessions[session_id] = SessionLog(run_config, first_id)
+    return session
+
+
+async def prune_sessions(checkpointer) -> None:
+    """SESSION_TTL を過ぎたセッションの記録とチェックポイントを削除する。"""
+    now = time.monotonic()
+    expired = [
+        session_id
+        for session_id, session in _sessions.items()
+        if now - session.touched_at > SESSION_TTL and not session.lock.locked()
+    ]
+    for session_id in expired:
+        del _sessions[session_id]
+        try:
+            await checkpointer.adelete_thread(session_id)
+        except Exception as e:
+            logging.warning(f"[session] {session_id} のチェックポイント削除に失敗: {e}")
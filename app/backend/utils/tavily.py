@@ -1,9 +1,18 @@
-import requests
 import os
+import httpx
+from utils import governor
+from utils.http_client import get_http_client
+from utils.tracing import span
+
+
+async def _post(url: str, payload: dict) -> httpx.Response:
+    response = await get_http_client().post(url, json=payload)
+    response.raise_for_status()
+    return response
 
 
 # 検索キーワードをインプットに検索結果を返す
-def search_tavily(query: str) -> list[str]:
+async def search_tavily(query: str) -> list[str]:
     url = "https://api.tavily.com/search"
     payload = {
         "api_key": os.environ["TAVILY_API_KEY"],
@@ -12,8 +21,8 @@ def search_tavily(query: str) -> list[str]:
         "max_results": 3,
         "include_answer": False,
     }
-    response = requests.post(url, json=payload)
-    response.raise_for_status()
+    async with span("tavily", name="search") as s:
+        response = await governor.call("tavily", _post, url, payload, span=s)
     results = response.json().get("results", [])
     return [
         f"{item['title']}（{item['url']}）\n{item.get('content', '')}"
@@ -1,66 +1,146 @@
 # --- utils/tmdb_recommender.py ---
-import requests
+# 見た映画ごとの「検索 → おすすめ取得」を並列に実行する。
+# おすすめ一覧の各作品にはタイトル・公開日・あらすじ・ジャンルIDが含まれるため、
+# 作品ごとの詳細取得は行わず、ジャンル名はジャンル一覧（1回だけ取得）から引く。
+# 検索結果・おすすめ・ジャンル一覧はセッションをまたいで TTLCache で共有する。
+import asyncio
+import logging
 import os
+import re
+import httpx
+from config import TMDB_CACHE_TTL, TMDB_CACHE_MAXSIZE
+from utils import governor
+from utils.http_client import get_http_client
+from utils.movie_record import MovieRecord
+from utils.tracing import CACHE_LOOKUPS, span
+from utils.ttl_cache import TTLCache, MISSING
 
-API_KEY = os.environ["TMDb_API_KEY"]
 BASE_URL = "https://api.themoviedb.org/3"
 
+_search_cache = TTLCache(TMDB_CACHE_MAXSIZE, TMDB_CACHE_TTL)
+_recommend_cache = TTLCache(TMDB_CACHE_MAXSIZE, TMDB_CACHE_TTL)
+_genre_cache = TTLCache(8, TMDB_CACHE_TTL)
 
-def search_movie_id(title, language="ja-JP"):
-    url = f"{BASE_URL}/search/movie"
-    params = {"api_key": API_KEY, "query": title.strip(), "language": language}
-    response = requests.get(url, params=params)
-    results = response.json().get("results", [])
-    return results[0]["id"] if results else None
 
+async def _request(url: str, params: dict) -> httpx.Response:
+    # 429・5xx は例外にしてガバナに再試行させる
+    return governor.raise_for_retryable(await get_http_client().get(url, params=params))
 
-def get_movie_details(movie_id, language="ja-JP"):
-    url = f"{BASE_URL}/movie/{movie_id}"
-    params = {"api_key": API_KEY, "language": language}
-    response = requests.get(url, params=params)
+
+async def _get_json(path: str, params: dict) -> dict:
+    # 作品IDはラベルに入れない（/movie/{id} などにまとめる）
+    async with span("tmdb", name=re.sub(r"\d+", "{id}", path)) as s:
+        response = await governor.call(
+            "tmdb",
+            _request,
+            f"{BASE_URL}{path}",
+            {"api_key": os.environ["TMDb_API_KEY"], **params},
+            span=s,
+        )
     return response.json()
 
 
-def get_recommended_movies(movie_id, language="ja-JP"):
-    url = f"{BASE_URL}/movie/{movie_id}/recommendations"
-    params = {"api_key": API_KEY, "language": language, "page": 1}
-    response = requests.get(url, params=params)
-    return response.json().get("results", [])
+async def _cached(cache: TTLCache, key, load):
+    value = cache.get(key)
+    CACHE_LOOKUPS.inc(cache="tmdb", result="miss" if value is MISSING else "hit")
+    if value is MISSING:
+        value = await load()
+        cache.set(key, value)
+    return value
 
 
-def get_recommendations_from_seen_movies(seen_movies_str, max_per_movie=2):
-    seen_movies = [
-        title.strip() for title in seen_movies_str.split(",") if title.strip()
-    ]
-    grouped_recommendations = []
+async def search_movie_id(title, language="ja-JP"):
+    async def load():
+        data = await _get_json(
+            "/search/movie", {"query": title.strip(), "language": language}
+        )
+        results = data.get("results", [])
+        return results[0]["id"] if results else None
+
+    return await _cached(_search_cache, (title.strip(), language), load)
+
+
+async def get_recommended_movies(movie_id, language="ja-JP"):
+    async def load():
+        data = await _get_json(
+            f"/movie/{movie_id}/recommendations", {"language": language, "page": 1}
+        )
+        return data.get("results", [])
+
+    return await _cached(_recommend_cache, (movie_id, language), load)
+
+
+# ジャンルID → ジャンル名
+async def get_genre_names(language="ja-JP") -> dict:
+    async def load():
+        data = await _get_json("/genre/movie/list", {"language": language})
+        return {g["id"]: g["name"] for g in data.get("genres", [])}
 
-    for source_title in seen_movies:
-        movie_id = search_movie_id(source_title)
-        if not movie_id:
+    return await _cached(_genre_cache, language, load)
+
+
+async def _recommendations_for(source_title, max_per_movie, genre_names_task):
+    movie_id = await search_movie_id(source_title)
+    if not movie_id:
+        return []
+    recommended = await get_recommended_movies(movie_id)
+    try:
+        genre_names = await genre_names_task
+    except Exception as e:
+        # ジャンル一覧が取れなくても、取得済みのおすすめはジャンル名なしで返す
+        logging.warning(f"[tmdb] ジャンル一覧の取得に失敗: {e}")
+        genre_names = {}
+
+    records = []
+    for movie in recommended[:max_per_movie]:
+        overview = (movie.get("overview") or "").strip()
+        if not overview:
             continue
-        recommended = get_recommended_movies(movie_id)
-        formatted_recommendations = []
-
-        for movie in recommended[:max_per_movie]:
-            details = get_movie_details(movie["id"])
-            overview = details.get("overview", "").strip()
-            if not overview:
-                continue
-            title = details.get("title", "タイトル不明")
-            release_date = details.get("release_date", "日付不明")
-            genres = [g["name"] for g in details.get("genres", [])]
-            formatted_recommendations.append(
-                f"- {title}（{release_date}）\n  ジャンル: {', '.join(genres)}\n  {overview}"
+        records.append(
+            MovieRecord(
+                source="tmdb",
+                group=f"【{source_title}】を見た人がよく見ている映画：",
+                title=movie.get("title", "タイトル不明"),
+                genres=tuple(
+                    genre_names[g]
+                    for g in movie.get("genre_ids", [])
+                    if g in genre_names
+                ),
+                release_date=movie.get("release_date", "日付不明"),
+                synopsis=overview,
             )
+        )
+    return records
 
-        if formatted_recommendations:
-            grouped_text = (
-                f"【{source_title}】を見た人がよく見ている映画：\n"
-                + "\n\n".join(formatted_recommendations)
-            )
-            grouped_recommendations.append(grouped_text)
 
-    return grouped_recommendations
+async def get_recommendations_from_seen_movies(
+    seen_movies_str, max_per_movie=2
+) -> list[MovieRecord]:
+    seen_movies = [
+        title.strip() for title in seen_movies_str.split(",") if title.strip()
+    ]
+    if not seen_movies:
+        return []
+
+    # ジャンル一覧の取得と、見た映画ごとの処理を並列に実行し、結果は入力順に並べる
+    genre_names_task = asyncio.ensure_future(get_genre_names())
+    try:
+        grouped = await asyncio.gather(
+            *(
+                _recommendations_for(source_title, max_per_movie, genre_names_task)
+                for source_title in seen_movies
+            )
+        )
+    finally:
+        genre_names_task.cancel()
+    return [record for records in grouped for record in records]
 
 
-print(get_recommendations_from_seen_movies("名探偵コナン,レミーのおいしいレストラン"))
+if __name__ == "__main__":
+    print(
+        asyncio.run(
+            get_recommendations_from_seen_movies(
+                "名探偵コナン,レミーのおいしいレストラン"
+            )
+        )
+    )
@@ -0,0 +1,8 @@
+# --- utils/tokens.py ---
+# トークナイザを使わない簡易なトークン数の見積もり。
+# 日本語などの非ASCII文字は1文字≒1トークン、ASCII文字は4文字≒1トークンとして数える。
+
+
+def estimate_tokens(text: str) -> int:
+    ascii_chars = sum(1 for ch in text if ch.isascii())
+    return (len(text) - ascii_chars) + (ascii_chars + 3) // 4
@@ -0,0 +1,82 @@
+# --- utils/tracing.py ---
+# グラフのノードと外部呼び出し（LLM・LangSmith・Filmarks・TMDb・Tavily）の計測。
+# 所要時間・待ち時間とキャッシュの当たり外れを utils/metrics に記録し、/metrics で公開する。
+#   async with span("tmdb", name="/search/movie") as s:
+#       async with semaphore:
+#           s.dequeued()  # ここまでが同時実行数の制限などによる待ち時間
+#           ...
+import asyncio
+import time
+
+from utils import metrics
+
+EXTERNAL_SECONDS = metrics.histogram(
+    "external_call_seconds", "外部呼び出しの所要時間（待ち時間を含む）"
+)
+EXTERNAL_QUEUE_SECONDS = metrics.histogram(
+    "external_call_queue_seconds", "外部呼び出しが同時実行数の制限などで待たされた時間"
+)
+NODE_SECONDS = metrics.histogram("graph_node_seconds", "グラフのノードの所要時間")
+CACHE_LOOKUPS = metrics.counter(
+    "cache_lookups_total", "キャッシュの参照数（result=hit|miss）"
+)
+
+
+def _outcome(exc_type) -> str:
+    if exc_type is None:
+        return "ok"
+    if issubclass(exc_type, asyncio.CancelledError):
+        return "cancelled"
+    return "error"
+
+
+class span:
+    """外部呼び出し1回分の計測。with / async with のどちらでも使える。"""
+
+    def __init__(self, kind: str, name: str = ""):
+        self.kind = kind
+        self.name = name
+        self.started = 0.0
+        self.seconds = 0.0  # 終了後の所要時間
+
+    def dequeued(self) -> None:
+        EXTERNAL_QUEUE_SECONDS.observe(
+            time.perf_counter() - self.started, kind=self.kind, name=self.name
+        )
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.started
+        EXTERNAL_SECONDS.observe(
+            self.seconds,
+            kind=self.kind,
+            name=self.name,
+            outcome=_outcome(exc_type),
+        )
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+def traced_node(name: str, node):
+    """ノードの所要時間を、ノード名と開始時の発言数（どのターンか）毎に記録する。"""
+
+    async def run(state, config):
+        started = time.perf_counter()
+        try:
+            return await node(state, config)
+        finally:
+            NODE_SECONDS.observe(
+                time.perf_counter() - started,
+                node=name,
+                turn=str(state["speak_count"]),
+            )
+
+    return run
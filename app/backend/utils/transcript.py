@@ -0,0 +1,75 @@
+# --- utils/transcript.py ---
+# 会話の要約を、プロンプトにそのまま入れられるテキストとして1件ずつ積み上げる。
+# 毎ターン summary 全体を join し直さず、要約が1件増えるたびに1行だけ追記する。
+# SUMMARY_TOKEN_BUDGET を超えたら、古い要約から順に1文に縮めた「これまでの流れ」に畳み込む。
+import re
+from dataclasses import dataclass
+
+from config import SUMMARY_TOKEN_BUDGET, SUMMARY_DIGEST_CHARS
+from utils.tokens import estimate_tokens
+
+DIGEST_HEADER = "（これまでの流れ）"
+
+
+def format_line(speaker: str, text: str) -> str:
+    return f"{speaker}：{text}"
+
+
+def _condense(line: str) -> str:
+    # 最初の1文だけを残し、長ければ切り詰める
+    speaker, _, text = line.partition("：")
+    sentence = re.split(r"(?<=[。！？!?])", text.strip(), maxsplit=1)[0]
+    if len(sentence) > SUMMARY_DIGEST_CHARS:
+        sentence = sentence[:SUMMARY_DIGEST_CHARS] + "…"
+    return format_line(speaker, sentence)
+
+
+@dataclass(frozen=True, slots=True)
+class Transcript:
+    digest: tuple[str, ...] = ()  # 畳み込んだ古い要約（1件1文）
+    lines: tuple[str, ...] = ()  # 直近の要約（そのままの形）
+    text: str = ""  # プロンプト用に描画済みのテキスト
+
+    def __post_init__(self):
+        # チェックポイントから復元するとタプルがリストで戻るため、タプルに揃える
+        object.__setattr__(self, "digest", tuple(self.digest))
+        object.__setattr__(self, "lines", tuple(self.lines))
+
+    def append(self, line: str) -> "Transcript":
+        lines = self.lines + (line,)
+        if not self.digest:
+            text = f"{self.text}\n{line}" if self.text else line
+            updated = Transcript(self.digest, lines, text)
+        else:
+            updated = Transcript(self.digest, lines, _render(self.digest, lines))
+        if SUMMARY_TOKEN_BUDGET > 0 and estimate_tokens(updated.text) > (
+            SUMMARY_TOKEN_BUDGET
+        ):
+            return updated._compress()
+        return updated
+
+    def _compress(self) -> "Transcript":
+        digest, lines = list(self.digest), list(self.lines)
+        text = self.text
+        # 直近の1件は必ず原文のまま残す
+        while estimate_tokens(text) > SUMMARY_TOKEN_BUDGET and len(lines) > 1:
+            digest.append(_condense(lines.pop(0)))
+            text = _render(digest, lines)
+        # それでも超える場合は、最も古い流れから捨てる
+        while estimate_tokens(text) > SUMMARY_TOKEN_BUDGET and digest:
+            digest.pop(0)
+            text = _render(digest, lines)
+        return Transcript(tuple(digest), tuple(lines), text)
+
+
+def _render(digest, lines) -> str:
+    if not digest:
+        return "\n".join(lines)
+    return "\n".join([DIGEST_HEADER, *digest, "", *lines])
+
+
+def append_summary(transcript: Transcript, items: list[dict]) -> Transcript:
+    """AppState.transcript のreducer。要約ノードが書いた要約を追記する。"""
+    for item in items:
+        transcript = transcript.append(format_line(item["speaker"], item["text"]))
+    return transcript
@@ -0,0 +1,50 @@
+# --- utils/ttl_cache.py ---
+# 件数上限（LRUで追い出し）と有効期限を持つメモリ上のキャッシュ。
+from collections import OrderedDict
+import threading
+import time
+
+MISSING = object()  # 未キャッシュを表す値（None もキャッシュできるようにするため）
+
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float, on_evict=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict  # 件数上限による追い出し時に呼ぶ関数（メトリクス用）
+        self.data = OrderedDict()  # {キー: (値, 保存時刻)}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None:
+                return MISSING
+            value, stored_at = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self.data[key]
+                return MISSING
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value) -> None:
+        with self.lock:
+            self.data[key] = (value, time.monotonic())
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                if self.on_evict is not None:
+                    self.on_evict()
+
+    def items(self) -> list:
+        # 期限内の (キー, 値) を古い順に返す（全件を走査する用途向け）
+        now = time.monotonic()
+        with self.lock:
+            return [
+                (key, value)
+                for key, (value, stored_at) in self.data.items()
+                if now - stored_at <= self.ttl
+            ]
+
+    def __len__(self) -> int:
+        return len(self.data)
@@ -18,9 +18,9 @@ const App = () => {
   );
 
   const [whiteboard, setWhiteboard] = useState(initialBoardState);
-  const [messages, setMessages] = useState<{ sender: string; text: string }[]>(
-    []
-  );
+  const [messages, setMessages] = useState<
+    { sender: string; text: string; turnId?: number }[]
+  >([]);
   const [userMessage, setUserMessage] = useState("");
   const [selectedGenres, setSelectedGenres] = useState<string[]>([]);
   const [seenMovies, setSeenMovies] = useState<string[]>([]);
@@ -28,27 +28,58 @@ const App = () => {
 
   const [selectedCharacters, setSelectedCharacters] = useState<string[]>([]);
 
-  const { startStreaming, isStreaming, thinkingAgent, thinkingDots } =
-    useStreamingChat({
-      userMessage,
-      selectedGenres,
-      seenMovies: seenMovies.join(","),
-      selectedCharacters,
-      onReceiveMessage: (speaker, text) => {
-        setMessages((prev) => [...prev, { sender: speaker, text }]);
-      },
-      onReceiveSummary: (speaker, text) => {
-        setWhiteboard((prev) => {
-          const current = prev[speaker];
-          return {
-            ...prev,
-            [speaker]:
-              current?.[0] === "（未回答）" ? [text] : [...current, text],
-          };
-        });
-      },
-      onStreamEnd: () => {},
-    });
+  const {
+    startStreaming,
+    isStreaming,
+    thinkingAgent,
+    thinkingDots,
+    busyRetryAfter,
+  } = useStreamingChat({
+    userMessage,
+    selectedGenres,
+    seenMovies: seenMovies.join(","),
+    selectedCharacters,
+    onReceiveMessage: (speaker, text, turnId) => {
+      setMessages((prev) => {
+        const index =
+          turnId === undefined
+            ? -1
+            : prev.findIndex((msg) => msg.turnId === turnId);
+        if (index === -1) {
+          return [...prev, { sender: speaker, text, turnId }];
+        }
+        // ストリーミング中の吹き出しを確定した発言で置き換える
+        const next = [...prev];
+        next[index] = { sender: speaker, text, turnId };
+        return next;
+      });
+    },
+    onReceiveToken: (speaker, delta, turnId, reset) => {
+      setMessages((prev) => {
+        const index = prev.findIndex((msg) => msg.turnId === turnId);
+        if (index === -1) {
+          return [...prev, { sender: speaker, text: delta, turnId }];
+        }
+        const next = [...prev];
+        next[index] = {
+          ...next[index],
+          text: reset ? delta : next[index].text + delta,
+        };
+        return next;
+      });
+    },
+    onReceiveSummary: (speaker, text) => {
+      setWhiteboard((prev) => {
+        const current = prev[speaker];
+        return {
+          ...prev,
+          [speaker]:
+            current?.[0] === "（未回答）" ? [text] : [...current, text],
+        };
+      });
+    },
+    onStreamEnd: () => {},
+  });
 
   useEffect(() => {
     chatEndRef.current?.scrollIntoView({ behavior: "auto" });
@@ -85,6 +116,7 @@ const App = () => {
           isStreaming={isStreaming}
           thinkingAgent={thinkingAgent}
           thinkingDots={thinkingDots}
+          busyRetryAfter={busyRetryAfter}
         />
         <div className="p-4 bg-white flex">
           <input
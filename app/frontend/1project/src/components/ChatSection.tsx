@@ -15,6 +15,7 @@ type Props = {
   isStreaming: boolean;
   thinkingAgent: string | null;
   thinkingDots: string;
+  busyRetryAfter: number | null;
 };
 
 const ChatSection = ({
@@ -22,6 +23,7 @@ const ChatSection = ({
   isStreaming,
   thinkingAgent,
   thinkingDots,
+  busyRetryAfter,
 }: Props) => {
   const chatEndRef = useRef<HTMLDivElement | null>(null);
 
@@ -81,6 +83,14 @@ const ChatSection = ({
         </div>
       )}
 
+      {isStreaming && busyRetryAfter !== null && (
+        <div className="flex items-center mt-2 text-gray-500 text-sm">
+          <p>
+            混雑しています。{busyRetryAfter}秒後にもう一度つなぎます{thinkingDots}
+          </p>
+        </div>
+      )}
+
       <div ref={chatEndRef} />
     </div>
   );
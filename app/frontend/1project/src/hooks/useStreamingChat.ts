@@ -1,12 +1,16 @@
 // hooks/useStreamingChat.ts
 import { useState, useEffect } from "react";
 
+// 接続が切れたときの自動再接続の上限（発言を受け取るたびに数え直す）
+const MAX_RECONNECTS = 5;
+
 export const useStreamingChat = ({
   userMessage,
   selectedGenres,
   seenMovies,
   selectedCharacters,
   onReceiveMessage,
+  onReceiveToken,
   onReceiveSummary,
   onStreamEnd,
 }: {
@@ -14,13 +18,21 @@ export const useStreamingChat = ({
   selectedGenres: string[];
   seenMovies: string;
   selectedCharacters: string[];
-  onReceiveMessage: (speaker: string, text: string) => void;
+  onReceiveMessage: (speaker: string, text: string, turnId?: number) => void;
+  onReceiveToken: (
+    speaker: string,
+    delta: string,
+    turnId: number,
+    reset: boolean
+  ) => void;
   onReceiveSummary: (speaker: string, text: string) => void;
   onStreamEnd: () => void;
 }) => {
   const [isStreaming, setIsStreaming] = useState(false);
   const [thinkingAgent, setThinkingAgent] = useState<string | null>(null);
   const [thinkingDots, setThinkingDots] = useState("");
+  // サーバーが混雑しているとき、つなぎ直すまでの秒数
+  const [busyRetryAfter, setBusyRetryAfter] = useState<number | null>(null);
 
   //「○○が入力しています…」の「…」のアニメーション表示
   useEffect(() => {
@@ -37,6 +49,12 @@ export const useStreamingChat = ({
   //バックエンドの呼び出し処理
   const startStreaming = () => {
     setIsStreaming(true);
+    // 会話の進め方: モバイルは短く軽い "fast"、デスクトップはツールを全部使う "deep"
+    const plan = window.matchMedia("(max-width: 768px)").matches
+      ? "fast"
+      : "deep";
+    // 接続が切れてもブラウザが自動で再接続し、サーバーが同じ会話の続きを送れるようにするID
+    const sessionId = crypto.randomUUID();
     const eventSource = new EventSource(
       `http://127.0.0.1:5000/chat/stream?user_message=${encodeURIComponent(
         userMessage
@@ -44,22 +62,49 @@ export const useStreamingChat = ({
         selectedGenres.join(",")
       )}&seen_movies=${encodeURIComponent(
         seenMovies
-      )}&characters=${encodeURIComponent(selectedCharacters.join(","))}`
+      )}&characters=${encodeURIComponent(
+        selectedCharacters.join(",")
+      )}&stream_tokens=1&plan=${plan}&session_id=${sessionId}`
     );
 
+    // 続けて失敗した再接続の回数
+    let reconnects = 0;
+
     // 通常のメッセージ受信
     eventSource.onmessage = (e) => {
+      reconnects = 0;
       const parsed = JSON.parse(e.data);
-      const { last_speaker: speaker, text, is_summary: isSummary } = parsed;
+      const {
+        last_speaker: speaker,
+        text,
+        is_summary: isSummary,
+        turn_id: turnId,
+      } = parsed;
 
       if (isSummary) {
         onReceiveSummary(speaker, text);
       } else {
         setThinkingAgent(speaker);
-        onReceiveMessage(speaker, text);
+        // 確定した発言。同じturn_idのトークン表示をこの内容で置き換える
+        onReceiveMessage(speaker, text, turnId);
       }
     };
 
+    // 生成途中のトークン受信（turn_idごとに連結して表示する）
+    eventSource.addEventListener("token", (e) => {
+      reconnects = 0;
+      const parsed = JSON.parse((e as MessageEvent).data);
+      const {
+        last_speaker: speaker,
+        delta,
+        turn_id: turnId,
+        reset,
+      } = parsed;
+      setThinkingAgent(speaker);
+      // reset: 再接続後にそのターンを最初から受け取り直す（途中までの表示を置き換える）
+      onReceiveToken(speaker, delta, turnId, reset === true);
+    });
+
     // フロー正常終了（イベント名 'end'）
     eventSource.addEventListener("end", () => {
       console.log("✅ フロー正常終了");
@@ -69,14 +114,47 @@ export const useStreamingChat = ({
       onStreamEnd();
     });
 
-    // エラー発生時（接続異常）
+    // サーバー混雑（イベント名 'busy'）。会話は始まっていないので、指定の秒数後に最初からつなぎ直す
+    eventSource.addEventListener("busy", (e) => {
+      const { retry_after: retryAfter } = JSON.parse((e as MessageEvent).data);
+      console.warn(`⏳ サーバー混雑: ${retryAfter}秒後に再接続`);
+      // ブラウザの自動再接続は止める
+      eventSource.close();
+      setThinkingAgent(null);
+      setBusyRetryAfter(retryAfter);
+      setTimeout(() => {
+        setBusyRetryAfter(null);
+        startStreaming();
+      }, retryAfter * 1000);
+    });
+
+    // エラー発生時（接続異常、またはサーバーからの error イベント）
     eventSource.onerror = (err) => {
-      console.error("❌ SSE接続エラー:", err);
+      if (err instanceof MessageEvent) {
+        // サーバーが会話の生成に失敗した。再接続しても同じ所で失敗するので閉じる
+        console.error("❌ 会話の生成に失敗:", err.data);
+      } else if (
+        eventSource.readyState === EventSource.CONNECTING &&
+        reconnects < MAX_RECONNECTS
+      ) {
+        // ブラウザが Last-Event-ID 付きで再接続する。受け取れなかった発言はサーバーが再送する
+        reconnects += 1;
+        console.warn(`⚠️ SSE再接続中 (${reconnects}/${MAX_RECONNECTS}):`, err);
+        return;
+      } else {
+        console.error("❌ SSE接続エラー:", err);
+      }
       eventSource.close();
       setIsStreaming(false);
       setThinkingAgent(null);
     };
   };
 
-  return { startStreaming, isStreaming, thinkingAgent, thinkingDots };
+  return {
+    startStreaming,
+    isStreaming,
+    thinkingAgent,
+    thinkingDots,
+    busyRetryAfter,
+  };
 };